@@ -0,0 +1,104 @@
+import argparse
+import os
+import shutil
+
+import pandas as pd
+import pyarrow.dataset as ds
+
+import store
+from cube import CUBE_DIR, DailyCube
+from pipeline import PARTS_DIR, PartWriter, read_dimensions
+
+DIMENSIONS_DIR = os.path.join(store.STORE_DIR, "dimensions")
+
+BATCH_TABLES = ("orders", "items", "payments", "reviews", "customers")
+CUSTOMER_COLUMNS = ["customer_id", "customer_unique_id", "customer_zip_code_prefix", "customer_city", "customer_state"]
+
+
+def cache_dimensions(dataset_dir=store.DATASET_DIR, dim_dir=DIMENSIONS_DIR, chunksize=200_000):
+    # Cleaned dimension tables, written once so appends never go back to the raw CSVs
+    sellers, product_df, geolocation_silver = read_dimensions(dataset_dir, chunksize)
+    os.makedirs(dim_dir, exist_ok=True)
+    for name, frame in (("sellers", sellers), ("products", product_df), ("geolocation", geolocation_silver)):
+        frame.to_parquet(os.path.join(dim_dir, f"{name}.parquet"), index=False)
+
+    shutil.rmtree(os.path.join(dim_dir, "customers"), ignore_errors=True)
+    customers = PartWriter(dim_dir, "customers", CUSTOMER_COLUMNS)
+    for chunk in pd.read_csv(os.path.join(dataset_dir, store.RAW_FILES["customers"]), chunksize=chunksize):
+        customers.write(chunk)
+
+
+def load_dimensions(dim_dir=DIMENSIONS_DIR):
+    return {name: pd.read_parquet(os.path.join(dim_dir, f"{name}.parquet")) for name in ("sellers", "products", "geolocation")}
+
+
+def lookup_customers(customer_ids, dim_dir=DIMENSIONS_DIR):
+    # Filter pushed down into the Parquet scan: only the batch's customers are materialized
+    dataset = ds.dataset(os.path.join(dim_dir, "customers"), format="parquet")
+    table = dataset.to_table(filter=ds.field("customer_id").isin(pd.unique(customer_ids).tolist()))
+    return table.to_pandas().drop_duplicates("customer_id")
+
+
+def read_batch(batch_dir):
+    # A batch directory holds new rows in the raw Olist CSV layout; customers are only needed for new customers
+    batch = {}
+    for key in BATCH_TABLES:
+        path = os.path.join(batch_dir, store.RAW_FILES[key])
+        if os.path.exists(path):
+            batch[key] = pd.read_csv(path, parse_dates=store.RAW_DATETIME_COLS.get(key, []))
+        elif key != "customers":
+            raise FileNotFoundError(path)
+    return batch
+
+
+def append_batch(batch, dimensions=None, dim_dir=DIMENSIONS_DIR, parts_dir=PARTS_DIR, cube_dir=CUBE_DIR, store_dir=store.STORE_DIR):
+    # Joins a batch of new orders against the cached dimensions, writes it as new parts and as delta
+    # files of the Feather store, and folds it into the persisted DailyCube the dashboard also reads.
+    # Work is proportional to the batch, not to the history.
+    dimensions = dimensions or load_dimensions(dim_dir)
+    if "customers" in batch and not batch["customers"].empty:
+        PartWriter(dim_dir, "customers", CUSTOMER_COLUMNS).write(batch["customers"])
+
+    orders = batch["orders"]
+    orders = store.clean_orders(orders[~orders["order_id"].isin(store.undelivered_order_ids(orders))])
+    delivered = orders["order_id"]
+    customers = lookup_customers(orders["customer_id"], dim_dir)
+    reviews = store.clean_reviews(batch["reviews"])
+
+    all_df, silver_df = store.merge_tables(
+        customers, orders,
+        batch["payments"][batch["payments"]["order_id"].isin(delivered)],
+        reviews[reviews["order_id"].isin(delivered)],
+        batch["items"][batch["items"]["order_id"].isin(delivered)],
+        dimensions["sellers"], dimensions["products"], dimensions["geolocation"],
+    )
+    PartWriter(parts_dir, store.MAIN_STORE, store.MAIN_COLUMNS).write(all_df)
+    PartWriter(parts_dir, store.GEO_STORE, store.GEO_COLUMNS).write(silver_df)
+    store.append_store(all_df, store.MAIN_STORE, store_dir)
+    store.append_store(silver_df, store.GEO_STORE, store_dir)
+
+    if os.path.exists(store.store_path(store.MAIN_STORE, store_dir)):
+        DailyCube.refresh(cube_dir, store_dir)
+    return len(all_df)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Append a batch of new orders to the partitioned tables and daily aggregates.")
+    parser.add_argument("batch", nargs="?", help="directory with the new orders, items, payments, reviews (and customers) CSVs")
+    parser.add_argument("--dataset", default=store.DATASET_DIR, help="raw Olist CSVs used to build the dimension cache")
+    parser.add_argument("--dimensions", default=DIMENSIONS_DIR, help="directory of the cached dimension tables")
+    parser.add_argument("--parts", default=PARTS_DIR, help="partitioned table directory written by pipeline.py")
+    parser.add_argument("--cube", default=CUBE_DIR, help="directory of the persisted daily aggregates")
+    parser.add_argument("--init", action="store_true", help="(re)build the dimension cache from --dataset first")
+    parser.add_argument("--store-dir", default=store.STORE_DIR, help="directory of the Feather store the batches are appended to")
+    parser.add_argument("--compact", action="store_true", help="fold the appended deltas into the Feather store's base file")
+    args = parser.parse_args()
+
+    if args.init or not os.path.isdir(args.dimensions):
+        cache_dimensions(args.dataset, args.dimensions)
+    if args.batch:
+        rows = append_batch(read_batch(args.batch), dim_dir=args.dimensions, parts_dir=args.parts, cube_dir=args.cube, store_dir=args.store_dir)
+        print(f"Appended {rows} orders")
+    if args.compact:
+        for name in (store.MAIN_STORE, store.GEO_STORE):
+            store.compact_store(name, args.store_dir)
@@ -0,0 +1,170 @@
+import argparse
+import hashlib
+import json
+import os
+import threading
+import urllib.request
+from contextlib import contextmanager
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(BASE_DIR, "data", "assets")
+INDEX_NAME = "index.json"
+# DASHBOARD_OFFLINE=1 never touches the network; only bundled and cached files are used
+OFFLINE = os.environ.get("DASHBOARD_OFFLINE", "").lower() in ("1", "true", "yes", "on")
+TIMEOUT = 10
+
+
+class Asset:
+    # A remote file with an optional copy bundled next to the code. sha256 pins the expected content.
+    def __init__(self, url, filename, sha256=None):
+        self.url = url
+        self.filename = filename
+        self.sha256 = sha256
+
+
+ASSETS = {
+    "logo": Asset("https://raw.githubusercontent.com/AndikaBN/subm_analisis_data_with_py/refs/heads/main/Dashboard/WTCf.png", "WTCf.png"),
+    "brazil_map": Asset("https://i.pinimg.com/originals/3a/0c/e1/3a0ce18b3c842748c255bc0aa445ad41.jpg", "brazil.jpg"),
+}
+
+# Per-process state: validated paths, file contents and decoded images by asset name
+_paths = {}
+_data = {}
+_images = {}
+_lock = threading.Lock()
+_prefetch = None
+
+
+def _sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def read_index(cache_dir=CACHE_DIR):
+    try:
+        with open(os.path.join(cache_dir, INDEX_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_index(index, cache_dir=CACHE_DIR):
+    path = os.path.join(cache_dir, INDEX_NAME)
+    with open(path + ".tmp", "w") as f:
+        json.dump(index, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def cached_path(name, cache_dir=CACHE_DIR):
+    # The cache is content-addressed (<sha256><ext>); the index maps each URL to its digest.
+    # A file only counts if its content still hashes to that digest (and to the pinned one, if any).
+    asset = ASSETS[name]
+    entry = read_index(cache_dir).get(asset.url)
+    if entry is None or (asset.sha256 and entry["sha256"] != asset.sha256):
+        return None
+    path = os.path.join(cache_dir, entry["file"])
+    try:
+        with open(path, "rb") as f:
+            if _sha256(f.read()) != entry["sha256"]:
+                return None
+    except OSError:
+        return None
+    return path
+
+
+def download(name, cache_dir=CACHE_DIR):
+    asset = ASSETS[name]
+    with urllib.request.urlopen(asset.url, timeout=TIMEOUT) as response:
+        content_type = response.headers.get("Content-Type", "")
+        data = response.read()
+    if content_type and not content_type.startswith("image/"):
+        raise ValueError(f"{asset.url} returned {content_type}, not an image")
+    digest = _sha256(data)
+    if asset.sha256 and digest != asset.sha256:
+        raise ValueError(f"{asset.url} does not match its pinned sha256")
+
+    os.makedirs(cache_dir, exist_ok=True)
+    filename = digest + os.path.splitext(asset.filename)[1]
+    path = os.path.join(cache_dir, filename)
+    with open(path + ".tmp", "wb") as f:
+        f.write(data)
+    os.replace(path + ".tmp", path)
+    with _lock:
+        index = read_index(cache_dir)
+        index[asset.url] = {"sha256": digest, "file": filename, "size": len(data)}
+        _write_index(index, cache_dir)
+    return path
+
+
+def path(name, fetch=False):
+    # Bundled file first, then the cache; only downloads when fetch is set and not OFFLINE
+    if name in _paths:
+        return _paths[name]
+    bundled = os.path.join(BASE_DIR, ASSETS[name].filename)
+    resolved = bundled if os.path.exists(bundled) else cached_path(name)
+    if resolved is None and fetch and not OFFLINE:
+        try:
+            resolved = download(name)
+        except (OSError, ValueError):
+            return None
+    if resolved is not None:
+        _paths[name] = resolved
+    return resolved
+
+
+def read_bytes(name):
+    # None until the asset is available locally; successful reads stay in memory for the process
+    if name not in _data:
+        resolved = path(name)
+        if resolved is None:
+            return None
+        with open(resolved, "rb") as f:
+            _data[name] = f.read()
+    return _data[name]
+
+
+def image(name):
+    # Decoded pixel array, kept in memory so reruns never decode again
+    if name not in _images:
+        resolved = path(name)
+        if resolved is None:
+            return None
+        import matplotlib.image as mpimg
+
+        _images[name] = mpimg.imread(resolved)
+    return _images[name]
+
+
+@contextmanager
+def offline():
+    # OFFLINE for the duration of the block only, restored afterwards even on errors
+    global OFFLINE
+    previous, OFFLINE = OFFLINE, True
+    try:
+        yield
+    finally:
+        OFFLINE = previous
+
+
+def fetch_missing(names=None):
+    return {name: path(name, fetch=True) for name in (names or ASSETS)}
+
+
+def prefetch(names=None):
+    # Downloads missing assets on a background thread, once per process, so rendering never waits on
+    # the network; whatever is still missing is drawn without until a later rerun
+    global _prefetch
+    if OFFLINE or _prefetch is not None:
+        return
+    missing = [name for name in (names or ASSETS) if path(name) is None]
+    if missing:
+        _prefetch = threading.Thread(target=fetch_missing, args=(missing,), daemon=True)
+        _prefetch.start()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Download the dashboard's remote assets into the local cache, e.g. before going offline.")
+    parser.add_argument("names", nargs="*", metavar="name", help=f"assets to fetch: {', '.join(ASSETS)} (default: all)")
+    args = parser.parse_args()
+
+    for name, resolved in fetch_missing(args.names).items():
+        print(f"{name}: {resolved or 'unavailable'}")
@@ -0,0 +1,209 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+import assets
+import store
+import synthetic
+from cube import DailyCube
+from delivery import DeliveryRollup
+from density import DensityPyramid
+from engine import OrdersDatabase
+from function import BrazilMapPlotter, DataAnalyzer
+from render import export_charts, figure_bytes
+from schema import optimize_frame
+from timeindex import TimeIndex
+
+ANALYZER_METHODS = [
+    "create_daily_orders_df", "create_sum_spend_df", "create_sum_order_items_df", "review_score_df",
+    "create_bystate_df", "create_order_status", "create_product_revenue_df", "create_customer_regions_df", "create_rfm_df",
+]
+
+
+def rss_bytes():
+    # Current resident set size; Linux only, 0 elsewhere
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+class PeakSampler:
+    # tracemalloc only sees Python and NumPy allocations, so Arrow buffers and RSS are sampled on a thread
+    def __init__(self, interval=0.002):
+        self.interval = interval
+        self.arrow_start = pa.total_allocated_bytes()
+        self.rss_start = rss_bytes()
+        self.arrow_peak = self.arrow_start
+        self.rss_peak = self.rss_start
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._done.is_set():
+            self._sample()
+            self._done.wait(self.interval)
+
+    def _sample(self):
+        self.arrow_peak = max(self.arrow_peak, pa.total_allocated_bytes())
+        self.rss_peak = max(self.rss_peak, rss_bytes())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._done.set()
+        self._thread.join()
+        self._sample()
+
+
+def measure(fn, repeat=3):
+    # Wall time over `repeat` runs, then one more run under tracemalloc for the peak of Python/NumPy
+    # allocations, with the peak Arrow allocations and RSS growth sampled alongside
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    with PeakSampler() as sampler:
+        fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "wall_min": min(times), "wall_median": statistics.median(times), "peak_mb": peak / 2 ** 20,
+        "arrow_peak_mb": (sampler.arrow_peak - sampler.arrow_start) / 2 ** 20, "rss_peak_mb": (sampler.rss_peak - sampler.rss_start) / 2 ** 20,
+    }
+
+
+def benchmarks(dataset_dir, store_dir, out_dir):
+    # name -> zero-argument callable; the store is built once so every later benchmark reads the same data.
+    # Call them inside assets.offline(), as run() does, so the chart export never downloads.
+    store.build_store(dataset_dir, store_dir)
+    all_df = store.load_store(store.MAIN_STORE, store_dir=store_dir)
+    time_index = TimeIndex(all_df, "order_approved_at")
+    cube = DailyCube.from_frame(all_df)
+    database = OrdersDatabase.open(store_dir)
+    delivery = DeliveryRollup.from_frame(all_df)
+    geolocation = store.load_store(store.GEO_STORE, columns=["customer_unique_id", "geolocation_lat", "geolocation_lng"], store_dir=store_dir)
+    geolocation = geolocation.drop_duplicates(subset="customer_unique_id")
+    density = DensityPyramid(geolocation["geolocation_lng"].to_numpy(), geolocation["geolocation_lat"].to_numpy())
+
+    # A quarter in the middle of the history, like a typical dashboard selection
+    middle = time_index.min + (time_index.max - time_index.min) / 2
+    start_date, end_date = middle.normalize().date(), (middle + pd.Timedelta(days=90)).normalize().date()
+
+    def boolean_filter():
+        approved = all_df["order_approved_at"]
+        return all_df[(approved >= str(start_date)) & (approved <= str(end_date))]
+
+    cases = {
+        "store.build": lambda: store.build_store(dataset_dir, store_dir),
+        "store.load": lambda: store.load_store(store.MAIN_STORE, store_dir=store_dir),
+        "schema.optimize_frame": lambda: optimize_frame(all_df),
+        "filter.boolean_mask": boolean_filter,
+        "filter.time_index": lambda: time_index.slice(start_date, end_date),
+        "cube.build": lambda: DailyCube.from_frame(all_df),
+    }
+    for method in ANALYZER_METHODS:
+        cases[f"analyzer.{method}"] = lambda method=method: getattr(DataAnalyzer(all_df), method)()
+    for method in ANALYZER_METHODS[:6]:
+        cases[f"analyzer.range.{method}"] = lambda method=method: getattr(DataAnalyzer.from_time_index(time_index, start_date, end_date), method)()
+        # The cube only answers distinct customer counts in approximate mode
+        kwargs = {"approximate": True} if method == "create_bystate_df" else {}
+        cases[f"analyzer.cube.{method}"] = lambda method=method, kwargs=kwargs: getattr(DataAnalyzer.from_time_index(time_index, start_date, end_date, cube=cube), method)(**kwargs)
+        cases[f"analyzer.sql.{method}"] = lambda method=method: getattr(DataAnalyzer.from_sql(database, start_date, end_date), method)()
+
+    cases["delivery.build"] = lambda: DeliveryRollup.from_frame(all_df)
+    for by in ("customer_state", "seller_id", "product_category_name_english"):
+        cases[f"delivery.range.{by}"] = lambda by=by: DataAnalyzer.from_time_index(time_index, start_date, end_date).create_delivery_sla_df(by)
+    for by in ("customer_state", "product_category_name_english"):
+        cases[f"delivery.rollup.{by}"] = lambda by=by: DataAnalyzer.from_time_index(time_index, start_date, end_date, delivery=delivery).create_delivery_sla_df(by)
+
+    cases["map.density"] = lambda: DensityPyramid(geolocation["geolocation_lng"].to_numpy(), geolocation["geolocation_lat"].to_numpy())
+    cases["map.render"] = lambda: figure_bytes(BrazilMapPlotter(geolocation, plt, None, density=density).figure())
+    cases["end_to_end.export_charts"] = lambda: export_charts(out_dir, periods=("all", "year"), store_dir=store_dir)
+    return cases
+
+
+def run(scales, repeat=3, seed=0, only=None, work_dir=None):
+    results = {}
+    for n_orders in scales:
+        # Nothing is downloaded while timing: the chart export uses only bundled or already cached assets
+        with tempfile.TemporaryDirectory(dir=work_dir) as tmp, assets.offline():
+            dataset_dir = synthetic.generate(os.path.join(tmp, "raw"), n_orders, seed)
+            cases = benchmarks(dataset_dir, os.path.join(tmp, "store"), os.path.join(tmp, "charts"))
+            scale = {}
+            for name, fn in cases.items():
+                if only and not any(name.startswith(prefix) for prefix in only):
+                    continue
+                scale[name] = measure(fn, repeat)
+                print(f"{n_orders:>10} {name:<45} {scale[name]['wall_median'] * 1000:10.1f} ms {scale[name]['peak_mb']:9.1f} MB "
+                      f"{scale[name]['arrow_peak_mb']:9.1f} MB arrow {scale[name]['rss_peak_mb']:9.1f} MB rss", flush=True)
+            results[str(n_orders)] = scale
+    return {
+        "meta": {
+            "python": sys.version.split()[0], "pandas": pd.__version__, "numpy": np.__version__,
+            "platform": platform.platform(), "cpus": os.cpu_count(), "seed": seed, "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def compare(current, baseline, tolerance=0.25):
+    # Benchmarks whose median wall time or peak memory grew by more than `tolerance` against the baseline
+    regressions = []
+    for scale, cases in current["results"].items():
+        for name, result in cases.items():
+            before = baseline.get("results", {}).get(scale, {}).get(name)
+            if before is None:
+                continue
+            for metric in ("wall_median", "peak_mb", "arrow_peak_mb"):
+                # Baselines recorded before Arrow memory was sampled have no arrow_peak_mb
+                if before.get(metric, 0) > 0 and result[metric] > before[metric] * (1 + tolerance):
+                    regressions.append((scale, name, metric, before[metric], result[metric]))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the dashboard's hot paths on synthetic Olist data and record a JSON baseline.")
+    parser.add_argument("--orders", type=int, nargs="+", default=[10_000, 100_000], help="synthetic dataset sizes, in orders")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", nargs="+", default=None, help="run only benchmarks whose name starts with one of these prefixes")
+    parser.add_argument("--work-dir", default=None, help="where to put the generated data (default: system temp)")
+    parser.add_argument("--out", default="bench.json", help="where to write the results")
+    parser.add_argument("--compare", default=None, help="baseline JSON to compare against; exits 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown or memory growth")
+    args = parser.parse_args()
+
+    current = run(args.orders, args.repeat, args.seed, args.only, args.work_dir)
+    with open(args.out, "w") as f:
+        json.dump(current, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(current, json.load(f), args.tolerance)
+        for scale, name, metric, before, after in regressions:
+            print(f"REGRESSION {scale} {name} {metric}: {before:.4g} -> {after:.4g}")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,117 @@
+import hashlib
+import sys
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+import pandas as pd
+
+
+def result_size(value):
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(result_size(item) for item in value)
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if hasattr(value, "__dict__"):
+        return sys.getsizeof(value) + sum(result_size(item) for item in vars(value).values())
+    return sys.getsizeof(value)
+
+
+class ResultCache:
+    # LRU cache bounded by entry count and total result size, safe to share between Streamlit sessions
+    def __init__(self, max_entries=256, max_bytes=256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.current_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key][0]
+
+    def put(self, key, value):
+        size = result_size(value)
+        if size > self.max_bytes:
+            return value
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self.current_bytes += size
+            while len(self._entries) > self.max_entries or self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+        return value
+
+    def get_or_compute(self, key, compute):
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            # Computed outside the lock so one slow aggregation does not block other sessions
+            value = self.put(key, compute())
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def key_part(value):
+    # Series arguments (e.g. a derived grouping key) are unhashable; they are keyed by name and content
+    if isinstance(value, pd.Series):
+        digest = hashlib.sha1(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes()).hexdigest()
+        return ("series", value.name, len(value), digest)
+    return value
+
+
+def backend(analyzer):
+    # What answers an analyzer's queries: the same method can give a different (e.g. approximate or
+    # undecoded) result from the cube, the delivery rollup or a SQL engine than from the order rows
+    return (type(analyzer.engine).__name__, analyzer.cube is not None, analyzer.delivery is not None, bool(analyzer.encoders))
+
+
+def cached(method):
+    # Memoizes an analyzer method on (dataset version, start_date, end_date, backend, method, arguments).
+    # Cached results are shared between callers and must not be modified in place.
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.cache is None:
+            return method(self, *args, **kwargs)
+        key = (
+            self.version, self.start_date, self.end_date, backend(self), method.__name__,
+            tuple(key_part(arg) for arg in args), tuple(sorted((name, key_part(arg)) for name, arg in kwargs.items())),
+        )
+        return self.cache.get_or_compute(key, lambda: method(self, *args, **kwargs))
+    return wrapper
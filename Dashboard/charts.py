@@ -0,0 +1,154 @@
+from functools import lru_cache
+
+import numpy as np
+
+from economics import HEXBIN_GRIDSIZE
+
+# Every chart builds a standalone Figure (no pyplot state), so charts can be rendered from any thread or process
+
+
+def figure(figsize):
+    # matplotlib takes about half a second to import, so it is only loaded once a chart is drawn
+    from matplotlib.figure import Figure
+    return Figure(figsize=figsize)
+
+
+@lru_cache(maxsize=None)
+def seaborn():
+    # Imported and themed on the first chart that is actually drawn, not when the dashboard starts
+    import seaborn as sns
+    sns.set(style='dark')
+    return sns
+
+
+def daily_orders(daily_orders_df):
+    sns = seaborn()
+    fig = figure((12, 6))
+    ax = fig.subplots()
+    sns.lineplot(
+        x=daily_orders_df["order_approved_at"],
+        y=daily_orders_df["order_count"],
+        marker="o",
+        linewidth=2,
+        color="#90CAF9",
+        ax=ax
+    )
+    ax.tick_params(axis="x", rotation=45)
+    ax.tick_params(axis="y", labelsize=15)
+    return fig
+
+
+def customer_spend(sum_spend_df):
+    sns = seaborn()
+    fig = figure((12, 6))
+    ax = fig.subplots()
+    sns.lineplot(
+        data=sum_spend_df,
+        x="order_approved_at",
+        y="total_spend",
+        marker="o",
+        linewidth=2,
+        color="#90CAF9",
+        ax=ax
+    )
+    ax.tick_params(axis="x", rotation=45)
+    ax.tick_params(axis="y", labelsize=15)
+    return fig
+
+
+def order_items(sum_order_items_df):
+    sns = seaborn()
+    fig = figure((22.5, 12.5))
+    ax1, ax2 = fig.subplots(nrows=1, ncols=2)
+    sns.barplot(x="product_count", y="product_category_name_english", data=sum_order_items_df.head(5), color="blue", ax=ax1)
+    sns.barplot(x="product_count", y="product_category_name_english", data=sum_order_items_df.sort_values(by="product_count", ascending=True).head(5), color="blue", ax=ax2)
+
+    ax1.set_xlabel("Number of Sales", fontsize=16)
+    ax1.set_title("Most sold products", loc="center", fontsize=18)
+    ax2.invert_xaxis()
+    return fig
+
+
+def review_scores(review_score):
+    sns = seaborn()
+    fig = figure((12, 6))
+    ax = fig.subplots()
+    sns.barplot(x=review_score.index, y=review_score.values, color="blue", ax=ax)
+
+    ax.set_title("Customer Review Scores for Service", fontsize=15)
+    ax.set_xlabel("Rating")
+    ax.set_ylabel("Count")
+    for i, v in enumerate(review_score.values):
+        ax.text(i, v + 5, str(v), ha='center', va='bottom', fontsize=12, color='black')
+    return fig
+
+
+def price_vs_sell_probability(hexbins):
+    # hexbins is (bins, extent) from economics.log_hexbins: one point per non-empty hexagon
+    seaborn()  # theme only
+    bins, extent = hexbins
+
+    fig = figure((8, 6))
+    ax = fig.subplots()
+    ax.set_title('Product Price vs. Sell Probability', fontsize=16)
+    ax.set_xlabel('Log Sell Probability', fontsize=12)
+    ax.set_ylabel('Log Product Price', fontsize=12)
+    ax.set_xlim(-11, -3)
+    ax.set_ylim(0, 9)
+    ax.set_yticks(range(10), [int(np.exp(x)) for x in range(10)], fontsize=10)
+    ax.set_xticks(range(-10, -2), [round(np.exp(x), 4) for x in range(-10, -2)], fontsize=10, rotation=30)
+
+    hb = ax.hexbin(bins.x, bins.y, gridsize=HEXBIN_GRIDSIZE, extent=extent, C=bins.total, reduce_C_function=np.sum, cmap='cividis')
+    cb = fig.colorbar(hb, ax=ax)
+    cb.set_label('Product Revenue (R$)', rotation=270, labelpad=20, fontsize=12)
+
+    fig.tight_layout()
+    return fig
+
+
+def mean_transaction_by_state(customer_regions):
+    seaborn()  # theme only
+    fig = figure((12, 4))
+    ax = fig.subplots()
+    plot = customer_regions.sort_values(by='mean_payment_value')
+    states = plot['customer_state'].astype(str)
+    ax.tick_params(axis='x', rotation=30)
+    ax.set_xlabel('State')
+    ax.set_ylabel('Mean Transaction (95% CI)')
+    ax.set_xlim(-0.5, len(plot) - 0.5)
+    ax.set_ylim(125, 325)
+    ax.scatter(states, plot['mean_payment_value'], s=100, c=plot['mean_payment_value'])
+    ax.vlines(states, plot['ci_low'], plot['ci_hi'], lw=.5)
+
+    fig.tight_layout()
+    return fig
+
+
+def customers_by_state(state, approximate=False):
+    sns = seaborn()
+    fig = figure((12, 6))
+    ax = fig.subplots()
+    sns.barplot(x=state.customer_state.values, y=state.customer_count.values, palette="viridis", ax=ax)
+
+    ax.set_title("Number of customers from State" + (" (≈ approximate)" if approximate else ""), fontsize=15)
+    ax.set_xlabel("State")
+    ax.set_ylabel("≈ Number of Customers" if approximate else "Number of Customers")
+    return fig
+
+
+def delivery_lead_times(delivery_daily_df):
+    sns = seaborn()
+    fig = figure((12, 6))
+    ax = fig.subplots()
+    for column, label, color in (("lead_days_p50", "Median", "#90CAF9"), ("lead_days_p90", "90th percentile", "#1565C0")):
+        sns.lineplot(x=delivery_daily_df["day"], y=delivery_daily_df[column], linewidth=2, color=color, label=label, ax=ax)
+    ax.set_xlabel(None)
+    ax.set_ylabel("Lead Time (days)")
+    ax.tick_params(axis="x", rotation=45)
+
+    rate = ax.twinx()
+    rate.plot(delivery_daily_df["day"], delivery_daily_df["on_time_rate"] * 100, color="#EF9A9A", linewidth=1)
+    rate.set_ylabel("On Time (%)")
+    rate.set_ylim(0, 100)
+    rate.grid(False)
+    return fig
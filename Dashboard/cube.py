@@ -0,0 +1,167 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+import sketch
+import store
+
+CUBE_DIR = os.path.join(store.STORE_DIR, "cube")
+CUBE_DIMENSIONS = ["customer_state", "product_category_name_english", "order_status", "review_score"]
+SKETCH_DIMENSIONS = ["customer_state"]
+CUBE_MEASURES = {"order_count": "sum", "revenue": "sum", "item_count": "sum"}
+# Columns of the merged table a cube is built from
+CUBE_COLUMNS = ["order_approved_at", "order_id", "payment_value", "product_id", "customer_id"] + CUBE_DIMENSIONS
+
+
+def merge_tail(frame, days, new, keys, aggregations):
+    # frame and new are sorted by day; days before the first day in `new` cannot change, so only the
+    # overlapping tail is re-aggregated
+    if new.empty:
+        return frame
+    lo = np.searchsorted(days, new["day"].to_numpy().min(), side="left")
+    tail = pd.concat([frame.iloc[lo:], new], ignore_index=True)
+    tail = tail.groupby(keys, observed=True, dropna=False, sort=True).agg(aggregations).reset_index()
+    return pd.concat([frame.iloc[:lo], tail], ignore_index=True)
+
+
+class DailyCube:
+    # Daily rollup of the merged order table: additive measures per day x dimensions, plus sparse
+    # HyperLogLog sketches of customer_id per day x customer_state for distinct customer counts.
+    # Sketches are also rolled up per calendar month, so long ranges merge months instead of days.
+    # Sketches hash the customer_id values as stored, never surrogate keys, so cubes built anywhere merge.
+    # segments lists the store segments the cube covers (see store.fold_segments).
+    def __init__(self, cells, customer_sketches, date_col="order_approved_at", precision=sketch.DEFAULT_PRECISION, segments=None):
+        self.cells = cells
+        self.customer_sketches = customer_sketches
+        self.date_col = date_col
+        self.precision = precision
+        self.segments = list(segments or [])
+        self._cell_days = cells["day"].to_numpy()
+        self._sketch_days = customer_sketches["day"].to_numpy()
+        self._monthly_sketches = None
+
+    @classmethod
+    def from_frame(cls, df, date_col="order_approved_at", precision=sketch.DEFAULT_PRECISION, error=None):
+        # error, when given, picks the sketch precision from a target relative standard error
+        if error is not None:
+            precision = sketch.precision_for_error(error)
+        rows = df[df[date_col].notna()]
+        day = rows[date_col].dt.normalize().rename("day")
+
+        # The merged table holds one row per order, so order counts are additive across cells
+        cells = rows.groupby([day] + [rows[col] for col in CUBE_DIMENSIONS], observed=True, dropna=False, sort=True).agg(
+            order_count=("order_id", "nunique"),
+            revenue=("payment_value", "sum"),
+            item_count=("product_id", "count"),
+        ).reset_index()
+
+        groups = pd.concat([day] + [rows[col] for col in SKETCH_DIMENSIONS], axis=1)
+        customer_sketches = sketch.sparse_registers(groups, rows["customer_id"], precision)
+
+        return cls(cells, customer_sketches, date_col, precision)
+
+    @classmethod
+    def load(cls, path):
+        with open(os.path.join(path, "cube.json")) as f:
+            meta = json.load(f)
+        cells = pd.read_parquet(os.path.join(path, "cells.parquet"))
+        customer_sketches = pd.read_parquet(os.path.join(path, "customer_sketches.parquet"))
+        return cls(cells, customer_sketches, meta["date_col"], meta["precision"], meta.get("segments"))
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        for name, frame in (("cells", self.cells), ("customer_sketches", self.customer_sketches)):
+            tmp_path = os.path.join(path, f"{name}.parquet.tmp")
+            frame.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, os.path.join(path, f"{name}.parquet"))
+        # Written last, so the recorded segments never claim data the tables do not hold yet
+        with open(os.path.join(path, "cube.json.tmp"), "w") as f:
+            json.dump({"date_col": self.date_col, "precision": self.precision, "segments": self.segments}, f)
+        os.replace(os.path.join(path, "cube.json.tmp"), os.path.join(path, "cube.json"))
+
+    @classmethod
+    def refresh(cls, path=CUBE_DIR, store_dir=store.STORE_DIR):
+        # The cube persisted at path, with the store segments it does not cover yet folded in and saved;
+        # built from every segment when there is none or the store's base file was rewritten since
+        cube = cls.load(path) if os.path.exists(os.path.join(path, "cube.json")) else None
+        cube, changed = store.fold_segments(cube, cls.from_frame, CUBE_COLUMNS, store_dir=store_dir)
+        if changed:
+            cube.save(path)
+        return cube
+
+    def __len__(self):
+        return len(self.cells)
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge cubes with different sketch precision")
+        # Fold in a cube built from orders that are not in this one yet; counts add and sketch registers take the max
+        cells = merge_tail(self.cells, self._cell_days, other.cells, ["day"] + CUBE_DIMENSIONS, CUBE_MEASURES)
+        customer_sketches = merge_tail(
+            self.customer_sketches, self._sketch_days, other.customer_sketches,
+            ["day"] + SKETCH_DIMENSIONS + ["register"], {"rank": "max"},
+        )
+        return DailyCube(cells, customer_sketches, self.date_col, self.precision, self.segments + other.segments)
+
+    @staticmethod
+    def _bounds(days, start_date, end_date):
+        lo = 0 if start_date is None else np.searchsorted(days, np.datetime64(pd.Timestamp(start_date).normalize()), side="left")
+        hi = len(days) if end_date is None else np.searchsorted(days, np.datetime64(pd.Timestamp(end_date).normalize()), side="right")
+        return lo, hi
+
+    def cells_between(self, start_date=None, end_date=None):
+        # Both ends are whole days and inclusive
+        lo, hi = self._bounds(self._cell_days, start_date, end_date)
+        return self.cells.iloc[lo:hi]
+
+    def daily(self, start_date=None, end_date=None, measures=("order_count", "revenue")):
+        cells = self.cells_between(start_date, end_date)
+        daily_df = cells.groupby("day")[list(measures)].sum()
+        if len(daily_df):
+            daily_df = daily_df.reindex(pd.date_range(daily_df.index.min(), daily_df.index.max(), freq="D"), fill_value=0)
+        daily_df.index.name = self.date_col
+        return daily_df
+
+    def totals(self, by, start_date=None, end_date=None, measure="order_count"):
+        cells = self.cells_between(start_date, end_date)
+        return cells.groupby(by, observed=True)[measure].sum()
+
+    @property
+    def monthly_sketches(self):
+        if self._monthly_sketches is None:
+            month = self._sketch_days.astype("datetime64[M]").astype("datetime64[ns]")
+            keys = [pd.Series(month, name="day")] + [self.customer_sketches[col] for col in SKETCH_DIMENSIONS + ["register"]]
+            self._monthly_sketches = self.customer_sketches["rank"].groupby(keys, observed=True, sort=True).max().reset_index()
+        return self._monthly_sketches
+
+    def sketch_rows(self, start_date=None, end_date=None):
+        # Sparse register rows covering the range: whole months from the monthly rollup, partial months from daily rows
+        if not len(self._sketch_days):
+            return self.customer_sketches
+        start = pd.Timestamp(self._sketch_days[0] if start_date is None else start_date).normalize()
+        end = pd.Timestamp(self._sketch_days[-1] if end_date is None else end_date).normalize()
+        first_month = start.to_period("M") + (0 if start_date is None or start.is_month_start else 1)
+        last_month = end.to_period("M") - (0 if end_date is None or end.is_month_end else 1)
+        if first_month > last_month:
+            lo, hi = self._bounds(self._sketch_days, start, end)
+            return self.customer_sketches.iloc[lo:hi]
+
+        head_lo, head_hi = self._bounds(self._sketch_days, start, first_month.start_time - pd.Timedelta(days=1))
+        tail_lo, tail_hi = self._bounds(self._sketch_days, last_month.end_time.normalize() + pd.Timedelta(days=1), end)
+        monthly = self.monthly_sketches
+        month_lo, month_hi = self._bounds(monthly["day"].to_numpy(), first_month.start_time, last_month.start_time)
+        return pd.concat([
+            self.customer_sketches.iloc[head_lo:head_hi],
+            monthly.iloc[month_lo:month_hi],
+            self.customer_sketches.iloc[tail_lo:tail_hi],
+        ], ignore_index=True)
+
+    def distinct_customers(self, start_date=None, end_date=None, by="customer_state"):
+        rows = self.sketch_rows(start_date, end_date)
+        codes, labels = pd.factorize(rows[by], sort=True)
+        known = codes >= 0
+        registers = sketch.merge_registers(codes[known], rows["register"].to_numpy()[known], rows["rank"].to_numpy()[known], len(labels), self.precision)
+        estimates = np.rint(sketch.estimate(registers)).astype(np.int64)
+        return pd.Series(estimates, index=pd.Index(np.asarray(labels, dtype=object), name=by), name="customer_count")
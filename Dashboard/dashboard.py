@@ -1,30 +1,75 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.image as mpimg
-import seaborn as sns
 import streamlit as st
-import urllib
-import numpy as np
-import scipy.stats as stats
 from function import DataAnalyzer, BrazilMapPlotter
-
-sns.set(style='dark')
+import store
+from schema import load_optimized
+from cache import ResultCache
+from cube import DailyCube
+from timeindex import TimeIndex
+from density import DensityPyramid
+from delivery import DeliveryRollup
+from render import ChartRenderer
+import assets
+import charts
+import perf
+import sketch
 
 # Dataset
-datetime_cols = ["order_approved_at", "order_delivered_carrier_date", "order_delivered_customer_date", "order_estimated_delivery_date", "order_purchase_timestamp", "shipping_limit_date"]
-all_df = pd.read_csv("https://raw.githubusercontent.com/AndikaBN/subm_analisis_data_with_py/refs/heads/main/Dashboard/olist_ecommerce_data.csv")
-all_df.sort_values(by="order_approved_at", inplace=True)
-all_df.reset_index(inplace=True)
-
-# Geolocation Dataset
-geolocation = pd.read_csv('https://raw.githubusercontent.com/AndikaBN/subm_analisis_data_with_py/refs/heads/main/Dashboard/olist_ecommerce_data_silver.csv')
-data = geolocation.drop_duplicates(subset='customer_unique_id')
-
-for col in datetime_cols:
-    all_df[col] = pd.to_datetime(all_df[col])
-
-min_date = all_df["order_approved_at"].min()
-max_date = all_df["order_approved_at"].max()
+@st.cache_resource
+def get_result_cache():
+    # One cache per server process, shared by every session
+    return ResultCache(max_entries=512, max_bytes=256 * 1024 * 1024)
+
+@st.cache_resource
+def get_chart_cache():
+    # Rendered PNG bytes, keyed on chart input data and parameters
+    return ResultCache(max_entries=256, max_bytes=128 * 1024 * 1024)
+
+# The optimized frame, the cube and the delivery rollup are persisted next to the store and record the
+# store segments they cover, so a start after append.py only processes the appended deltas
+@st.cache_resource
+def load_main_df(version):
+    # Hex IDs become int32 surrogate keys; the encoders are kept to decode the IDs a view shows
+    return load_optimized()
+
+@st.cache_resource
+def load_time_index(version):
+    return TimeIndex(load_main_df(version)[0], "order_approved_at")
+
+@st.cache_resource
+def load_cube(version):
+    # Shared with append.py, and built from the stored customer_id values rather than surrogate keys
+    return DailyCube.refresh()
+
+@st.cache_resource
+def load_delivery(version):
+    # Days a delta shares with the rollup are recomputed from the in-memory orders
+    return DeliveryRollup.refresh(orders=load_time_index(version).slice)
+
+@st.cache_resource
+def load_geolocation_df(version):
+    geolocation = store.load_store(store.GEO_STORE, columns=["customer_unique_id", "geolocation_lat", "geolocation_lng"])
+    return geolocation.drop_duplicates(subset='customer_unique_id')
+
+@st.cache_resource
+def load_density(version):
+    geolocation = load_geolocation_df(version)
+    return DensityPyramid(geolocation["geolocation_lng"].to_numpy(), geolocation["geolocation_lat"].to_numpy())
+
+perf.start_run()
+# Missing remote images download in the background; nothing below waits for them
+assets.prefetch()
+
+with perf.stage("data.setup"):
+    store.ensure_store()
+    data_version = store.store_version(store.MAIN_STORE)
+    all_df, encoders = load_main_df(data_version)
+    time_index = load_time_index(data_version)
+    cube = load_cube(data_version)
+result_cache = get_result_cache()
+renderer = ChartRenderer(get_chart_cache(), fmt="png", dpi=100)
+
+min_date = time_index.min
+max_date = time_index.max
 
 # Sidebar
 with st.sidebar:
@@ -32,7 +77,7 @@ with st.sidebar:
     with col1:
         st.write(' ')
     with col2:
-        st.image("https://raw.githubusercontent.com/AndikaBN/subm_analisis_data_with_py/refs/heads/main/Dashboard/WTCf.png", width=100)
+        st.image(assets.read_bytes("logo"), width=100)
     with col3:
         st.write(' ')
 
@@ -45,18 +90,11 @@ with st.sidebar:
     )
 
 # Main
-main_df = all_df[(all_df["order_approved_at"] >= str(start_date)) & 
-                 (all_df["order_approved_at"] <= str(end_date))]
-
-function = DataAnalyzer(main_df)
-map_plot = BrazilMapPlotter(data, plt, mpimg, urllib, st)
-
-daily_orders_df = function.create_daily_orders_df()
-sum_spend_df = function.create_sum_spend_df()
-sum_order_items_df = function.create_sum_order_items_df()
-review_score, common_score = function.review_score_df()
-state, most_common_state = function.create_bystate_df()
-order_status, common_status = function.create_order_status()
+# Sections compute their data where they are drawn. The full-history charts sit in fragments, so
+# interacting with one reruns just that fragment, and the map only loads (with pyplot) once its
+# view is picked.
+function = DataAnalyzer.from_time_index(time_index, start_date, end_date, cache=result_cache, version=data_version, cube=cube)
+full_analyzer = DataAnalyzer(all_df, cache=result_cache, version=data_version)
 
 # Define your Streamlit app
 st.title("E-Commerce Public Data Analysis")
@@ -64,6 +102,7 @@ st.write("**This is a dashboard for analyzing E-Commerce public data.**")
 
 ### VISUALIZATION 1: Daily Orders Delivered ###
 st.subheader("Daily Orders Delivered")
+daily_orders_df = function.create_daily_orders_df()
 col1, col2 = st.columns(2)
 
 with col1:
@@ -74,21 +113,11 @@ with col2:
     total_revenue = daily_orders_df["revenue"].sum()
     st.markdown(f"Total Revenue: **{total_revenue}**")
 
-fig, ax = plt.subplots(figsize=(12, 6))
-sns.lineplot(
-    x=daily_orders_df["order_approved_at"],
-    y=daily_orders_df["order_count"],
-    marker="o",
-    linewidth=2,
-    color="#90CAF9",
-    ax=ax
-)
-ax.tick_params(axis="x", rotation=45)
-ax.tick_params(axis="y", labelsize=15)
-st.pyplot(fig)
+st.image(renderer.render("daily_orders", charts.daily_orders, daily_orders_df))
 
 ### VISUALIZATION 2: Customer Spend Money ###
 st.subheader("Customer Spend Money")
+sum_spend_df = function.create_sum_spend_df()
 col1, col2 = st.columns(2)
 
 with col1:
@@ -99,22 +128,11 @@ with col2:
     avg_spend = sum_spend_df["total_spend"].mean()
     st.markdown(f"Average Spend: **{avg_spend}**")
 
-fig, ax = plt.subplots(figsize=(12, 6))
-sns.lineplot(
-    data=sum_spend_df,
-    x="order_approved_at",
-    y="total_spend",
-    marker="o",
-    linewidth=2,
-    color="#90CAF9",
-    ax=ax
-)
-ax.tick_params(axis="x", rotation=45)
-ax.tick_params(axis="y", labelsize=15)
-st.pyplot(fig)
+st.image(renderer.render("customer_spend", charts.customer_spend, sum_spend_df))
 
 ### VISUALIZATION 3: Order Items ###
 st.subheader("Order Items")
+sum_order_items_df = function.create_sum_order_items_df()
 col1, col2 = st.columns(2)
 
 with col1:
@@ -125,17 +143,11 @@ with col2:
     avg_items = sum_order_items_df["product_count"].mean()
     st.markdown(f"Average Items: **{avg_items}**")
 
-fig, (ax1, ax2) = plt.subplots(nrows=1, ncols=2, figsize=(22.5, 12.5))
-sns.barplot(x="product_count", y="product_category_name_english", data=sum_order_items_df.head(5), color="blue", ax=ax1)
-sns.barplot(x="product_count", y="product_category_name_english", data=sum_order_items_df.sort_values(by="product_count", ascending=True).head(5), color="blue", ax=ax2)
-
-ax1.set_xlabel("Number of Sales", fontsize=16)
-ax1.set_title("Most sold products", loc="center", fontsize=18)
-ax2.invert_xaxis()
-st.pyplot(fig)
+st.image(renderer.render("order_items", charts.order_items, sum_order_items_df))
 
 ### VISUALIZATION 4: Review Score ###
 st.subheader("Review Score")
+review_score, common_score = function.review_score_df()
 col1, col2 = st.columns(2)
 
 with col1:
@@ -146,118 +158,111 @@ with col2:
     most_common_review_score = review_score.value_counts().idxmax()
     st.markdown(f"Most Common Review Score: **{most_common_review_score}**")
 
-fig, ax = plt.subplots(figsize=(12, 6))
-sns.barplot(x=review_score.index, y=review_score.values, color="blue", ax=ax)
-
-plt.title("Customer Review Scores for Service", fontsize=15)
-plt.xlabel("Rating")
-plt.ylabel("Count")
-for i, v in enumerate(review_score.values):
-    ax.text(i, v + 5, str(v), ha='center', va='bottom', fontsize=12, color='black')
-st.pyplot(fig)
+st.image(renderer.render("review_scores", charts.review_scores, review_score))
 
 ### VISUALIZATION 5: Product Price vs. Sell Probability ###
 st.subheader("Product Price vs. Sell Probability")
-items_product = all_df[['order_id', 'product_id', 'price', 'order_item_id']].copy()
-orders_ip = all_df[['order_id']].merge(items_product, on='order_id', how='inner')
-
-product_revenue = orders_ip.pivot_table(index=['product_id'], aggfunc={'order_item_id': 'sum', 'price': 'mean'})
-product_revenue['total'] = product_revenue['order_item_id'] * product_revenue['price']
-product_revenue.rename(columns={'order_item_id': 'sell_probability'}, inplace=True)
-product_revenue['sell_probability'] = product_revenue['sell_probability'] / len(product_revenue)
-product_revenue.sort_values(by='total', ascending=False)
-
-x = np.log(product_revenue.sell_probability)
-y = np.log(product_revenue.price)
-
-fig, ax = plt.subplots(figsize=(8, 6))
-plt.title('Product Price vs. Sell Probability', fontsize=16)
-plt.xlabel('Log Sell Probability', fontsize=12)
-plt.ylabel('Log Product Price', fontsize=12)
-plt.xlim(-11, -3)
-plt.ylim(0, 9)
-plt.yticks(range(10), [int(np.exp(x)) for x in range(10)], fontsize=10)
-plt.xticks(range(-10, -2), [round(np.exp(x), 4) for x in range(-10, -2)], fontsize=10, rotation=30)
-
-hb = ax.hexbin(x, y, gridsize=14, C=product_revenue.total, reduce_C_function=np.sum, cmap='cividis')
-cb = fig.colorbar(hb, ax=ax)
-cb.set_label('Product Revenue (R$)', rotation=270, labelpad=20, fontsize=12)
-
-plt.tight_layout()
-st.pyplot(fig)
+
+@st.fragment
+def product_price_section():
+    if not st.toggle("Show chart", value=True, key="show_price_vs_sell_probability"):
+        return
+    categories = tuple(st.multiselect("Categories", full_analyzer.create_product_economics().categories(), placeholder="All categories"))
+    hexbins = full_analyzer.create_product_hexbins(categories=categories or None)
+    st.image(renderer.render("price_vs_sell_probability", charts.price_vs_sell_probability, hexbins, key=(data_version, categories)))
+
+product_price_section()
 
 ### VISUALIZATION 6: Mean Transaction by State (95% CI) ###
 st.subheader("Mean Transaction by State (95% CI)")
 
-orders = all_df[['order_id', 'order_status', 'order_purchase_timestamp', 'order_approved_at', 'customer_id']].copy()
-payments = all_df[['order_id', 'payment_value']].copy()
-customers = all_df[['customer_id', 'customer_unique_id', 'customer_state']].copy()
-
-pay_ord_cust = orders.merge(payments, on='order_id', how='outer').merge(customers, on='customer_id', how='outer')
-customer_spent = pay_ord_cust.groupby('customer_unique_id').agg({'payment_value': 'sum'}).sort_values(by='payment_value', ascending=False)
-
-customer_mean = customer_spent['payment_value'].mean()
-customer_std = stats.sem(customer_spent['payment_value'])
-confidence_interval = stats.t.interval(0.95, loc=customer_mean, scale=customer_std, df=len(customer_spent) - 1)
-
-customer_regions = pay_ord_cust.groupby('customer_state').agg({
-    'payment_value': ['mean', 'std'], 
-    'customer_unique_id': 'count'
-})
-customer_regions.columns = ['mean_payment_value', 'std_payment_value', 'count_customers']
-customer_regions.reset_index(inplace=True)
-
-ci_low = []
-ci_hi = []
-for index, row in customer_regions.iterrows():
-    mean = row['mean_payment_value']
-    std = row['std_payment_value']
-    count = row['count_customers']
-    
-    if count > 1:
-        ci = stats.t.interval(0.95, loc=mean, scale=std / np.sqrt(count), df=count - 1)
-        ci_low.append(ci[0])
-        ci_hi.append(ci[1])
-    else:
-        ci_low.append(np.nan)
-        ci_hi.append(np.nan)
-
-customer_regions['ci_low'] = ci_low
-customer_regions['ci_hi'] = ci_hi
-
-fig, ax = plt.subplots(figsize=(12, 4))
-plot = customer_regions.sort_values(by='mean_payment_value')
-plt.xticks(rotation=30)
-plt.xlabel('State')
-plt.ylabel('Mean Transaction (95% CI)')
-plt.xlim(-0.5, len(plot) - 0.5)
-plt.ylim(125, 325)
-plt.scatter(plot['customer_state'], plot['mean_payment_value'], s=100, c=plot['mean_payment_value'])
-plt.vlines(plot['customer_state'], plot['ci_low'], plot['ci_hi'], lw=.5)
-
-plt.tight_layout()
-st.pyplot(fig)
+@st.fragment
+def mean_transaction_section():
+    if not st.toggle("Show chart", value=True, key="show_mean_transaction_by_state"):
+        return
+    customer_regions = full_analyzer.create_customer_regions_df()
+    st.image(renderer.render("mean_transaction_by_state", charts.mean_transaction_by_state, customer_regions, key=data_version))
+
+mean_transaction_section()
 
 ### VISUALIZATION 7: Customer Demographic ###
 st.subheader("Customer Demographic")
-tab1, tab2 = st.tabs(["State", "Geolocation"])
 
-with tab1:
-    most_common_state = state.customer_state.value_counts().index[0]
-    st.markdown(f"Most Common State: **{most_common_state}**")
+@st.fragment
+def customer_demographic_section():
+    # A view switch rather than st.tabs: tabs run every tab's code, this only runs the one on screen
+    view = st.radio("View", ["State", "Geolocation"], horizontal=True, label_visibility="collapsed")
+
+    if view == "State":
+        # Exact by default; the estimate from the cube's sketches is opt-in and labelled as such
+        approximate = st.toggle(
+            "Approximate counts", key="approximate_customers_by_state",
+            help=f"Estimate distinct customers with HyperLogLog sketches (about ±{sketch.relative_error(cube.precision):.1%}) instead of counting them",
+        )
+        state, most_common_state = function.create_bystate_df(approximate=approximate)
+        st.markdown(f"Most Common State: **{most_common_state}**")
+        if approximate:
+            st.caption("≈ approximate customer counts")
+
+        st.image(renderer.render("customers_by_state", charts.customers_by_state, state, approximate=approximate))
+        return
+
+    import matplotlib.pyplot as plt
+
+    # Geolocation Dataset
+    geo_version = store.store_version(store.GEO_STORE)
+    with perf.stage("data.geolocation"):
+        data = load_geolocation_df(geo_version)
+    map_plot = BrazilMapPlotter(data, plt, st, density=load_density(geo_version))
+
+    map_regions = {
+        "Brazil": None,
+        "Southeast": (-53.2, -39.6, -25.4, -14.2),
+        "South": (-57.7, -48.0, -33.8, -22.5),
+        "Northeast": (-48.8, -34.7, -18.4, -1.0),
+    }
+    region = st.selectbox("Zoom", list(map_regions))
+    # Keyed on the background path too, so the map is redrawn once a prefetched background arrives
+    st.image(renderer.render("customer_map", map_plot.figure, key=(geo_version, assets.path("brazil_map")), bounds=map_regions[region]))
 
-    fig, ax = plt.subplots(figsize=(12, 6))
-    sns.barplot(x=state.customer_state.value_counts().index, y=state.customer_count.values, palette="viridis", ax=ax)
+    with st.expander("See Explanation"):
+        st.write('Menurut grafik yang telah dibuat, terdapat lebih banyak pelanggan di wilayah tenggara dan selatan. Selain itu, sebagian besar pelanggan berada di kota-kota yang merupakan ibu kota, seperti São Paulo, Rio de Janeiro, Porto Alegre, dan lain-lain.')
 
-    plt.title("Number of customers from State", fontsize=15)
-    plt.xlabel("State")
-    plt.ylabel("Number of Customers")
-    st.pyplot(fig)
+customer_demographic_section()
 
-with tab2:
-    map_plot.plot()
+### VISUALIZATION 8: Delivery Performance ###
+st.subheader("Delivery Performance")
 
-    with st.expander("See Explanation"):
-        st.write('Menurut grafik yang telah dibuat, terdapat lebih banyak pelanggan di wilayah tenggara dan selatan. Selain itu, sebagian besar pelanggan berada di kota-kota yang merupakan ibu kota, seperti São Paulo, Rio de Janeiro, Porto Alegre, dan lain-lain.')
+@st.fragment
+def delivery_section():
+    if not st.toggle("Show chart", value=True, key="show_delivery_performance"):
+        return
+    # Served from the daily delivery rollup, so changing the date range does not rescan the orders
+    analyzer = DataAnalyzer.from_time_index(time_index, start_date, end_date, cache=result_cache, version=data_version, delivery=load_delivery(data_version), encoders=encoders)
+    overall = analyzer.create_delivery_sla_df(by=None)
+    col1, col2, col3 = st.columns(3)
+
+    with col1:
+        st.markdown(f"On Time: **{overall['on_time_rate'].iloc[0]:.1%}**")
+
+    with col2:
+        st.markdown(f"Median Lead Time: **{overall['lead_days_p50'].iloc[0]:.1f} days**")
+
+    with col3:
+        st.markdown(f"90th Percentile: **{overall['lead_days_p90'].iloc[0]:.1f} days**")
+
+    st.image(renderer.render("delivery_lead_times", charts.delivery_lead_times, analyzer.create_delivery_daily_df()))
+
+    breakdowns = {"State": "customer_state", "Category": "product_category_name_english", "Seller": "seller_id"}
+    breakdown = st.radio("Breakdown", list(breakdowns), horizontal=True)
+    st.dataframe(analyzer.create_delivery_sla_df(by=breakdowns[breakdown]), hide_index=True)
+
+delivery_section()
 
 st.caption('Copyright (C) Andika Bintang Nursalih 2024')
+
+# Only shown when DASHBOARD_PERF is set
+perf_records = perf.end_run()
+if perf_records:
+    with st.expander("Performance"):
+        st.dataframe(perf_records)
@@ -0,0 +1,272 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+import store
+from cube import merge_tail
+
+DELIVERY_DIR = os.path.join(store.STORE_DIR, "delivery")
+NS_PER_DAY = 86_400_000_000_000
+NAT = np.iinfo(np.int64).min
+PERCENTILES = (0.5, 0.9, 0.95)
+DELIVERY_DIMENSIONS = ["customer_state", "seller_id", "product_category_name_english"]
+ROLLUP_DIMENSIONS = ["customer_state", "product_category_name_english"]
+# Columns of the merged table a DeliveryTable is built from
+TABLE_COLUMNS = [
+    "order_approved_at", "order_purchase_timestamp", "order_delivered_carrier_date", "order_delivered_customer_date",
+    "order_estimated_delivery_date", "shipping_limit_date",
+] + DELIVERY_DIMENSIONS
+
+# Lead-time histogram: 6-hour bins up to 120 days, longer deliveries share the last bin
+BIN_NS = NS_PER_DAY // 4
+N_BINS = 120 * 4
+
+# Per-order measures (days, from int64 nanosecond differences) and the additive sums behind them
+LEGS = {"lead_days": "lead_ns", "seller_days": "seller_ns", "carrier_days": "carrier_ns"}
+SUMS = ["orders", "on_time", "handover_late", "lead_days_sum", "seller_days_sum", "carrier_days_sum", "late_days_sum"]
+
+
+def to_ns(values):
+    # datetime64 values as int64 nanoseconds, plus the mask of non-NaT entries
+    ns = np.asarray(values, dtype="datetime64[ns]").view(np.int64)
+    return ns, ns != NAT
+
+
+def _days(ns):
+    return ns / NS_PER_DAY
+
+
+def _finish(sums):
+    # SLA metrics from summed counts and day totals
+    late = sums["orders"] - sums["on_time"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sla = pd.DataFrame({
+            "orders": sums["orders"].astype(np.int64),
+            "on_time_rate": sums["on_time"] / sums["orders"],
+            "late_orders": late.astype(np.int64),
+            "days_late_mean": (sums["late_days_sum"] / late).where(late > 0),
+            "lead_days_mean": sums["lead_days_sum"] / sums["orders"],
+            "seller_days_mean": sums["seller_days_sum"] / sums["orders"],
+            "carrier_days_mean": sums["carrier_days_sum"] / sums["orders"],
+            "handover_late_rate": sums["handover_late"] / sums["orders"],
+        }, index=sums.index)
+    return sla
+
+
+class DeliveryTable:
+    # One row per delivered order: the approval day, the breakdown dimensions, int64 nanosecond lead
+    # times for the whole delivery and its seller (purchase -> carrier) and carrier (carrier -> customer)
+    # legs, lateness against the estimate, and boolean on-time / late-handover flags.
+    def __init__(self, orders):
+        self.orders = orders
+
+    @classmethod
+    def from_frame(cls, df, date_col="order_approved_at"):
+        day, has_day = to_ns(df[date_col])
+        purchase, has_purchase = to_ns(df["order_purchase_timestamp"])
+        carrier, has_carrier = to_ns(df["order_delivered_carrier_date"])
+        delivered, has_delivered = to_ns(df["order_delivered_customer_date"])
+        estimated, has_estimate = to_ns(df["order_estimated_delivery_date"])
+        limit, has_limit = to_ns(df["shipping_limit_date"])
+        keep = has_day & has_purchase & has_carrier & has_delivered & has_estimate
+
+        orders = pd.DataFrame({
+            "day": (day[keep] // NS_PER_DAY * NS_PER_DAY).view("datetime64[ns]"),
+            **{col: df[col].array[keep] for col in DELIVERY_DIMENSIONS},
+            "lead_ns": (delivered - purchase)[keep],
+            "seller_ns": (carrier - purchase)[keep],
+            "carrier_ns": (delivered - carrier)[keep],
+            "lateness_ns": (delivered - estimated)[keep],
+            # Same rule as the store's delivered_on_time labels: strictly before the estimate
+            "on_time": (delivered < estimated)[keep],
+            "handover_late": (has_limit & (carrier > limit))[keep],
+        })
+        return cls(orders.sort_values("day", kind="stable", ignore_index=True))
+
+    def __len__(self):
+        return len(self.orders)
+
+    def _sums(self, keys):
+        orders = self.orders
+        late = ~orders["on_time"].to_numpy()
+        frame = pd.DataFrame({
+            "orders": np.ones(len(orders), dtype=np.int64),
+            "on_time": orders["on_time"].to_numpy(),
+            "handover_late": orders["handover_late"].to_numpy(),
+            **{f"{leg}_sum": _days(orders[col].to_numpy()) for leg, col in LEGS.items()},
+            "late_days_sum": np.where(late, _days(orders["lateness_ns"].to_numpy()), 0.0),
+        })
+        if not keys:
+            return frame.sum().to_frame("all").T
+        return frame.groupby([orders[key] for key in keys], observed=True, dropna=False, sort=True).sum()
+
+    def sla(self, by=None):
+        # Exact SLA metrics per value of `by` (or one "all" row), with exact lead-time percentiles
+        keys = [by] if by else []
+        sla = _finish(self._sums(keys))
+        lead_days = pd.Series(_days(self.orders["lead_ns"].to_numpy()), index=self.orders.index)
+        grouped = lead_days.groupby(self.orders[by], observed=True, dropna=False, sort=True) if keys else None
+        for q in PERCENTILES:
+            # One quantile per pass keeps the groups in the same order as the sums (unstack would move NaN)
+            sla[f"lead_days_p{round(q * 100)}"] = grouped.quantile(q).to_numpy() if keys else lead_days.quantile(q)
+        return sla
+
+    def daily(self):
+        # Per approval day: on-time rate and exact lead-time percentiles
+        daily = _finish(self._sums(["day"]))[["orders", "on_time_rate", "lead_days_mean"]]
+        lead_days = pd.Series(_days(self.orders["lead_ns"].to_numpy()), index=self.orders.index)
+        grouped = lead_days.groupby(self.orders["day"], sort=True)
+        for q in PERCENTILES:
+            daily[f"lead_days_p{round(q * 100)}"] = grouped.quantile(q).to_numpy()
+        return daily
+
+    def histogram(self, keys):
+        # Lead-time counts per 6-hour bin and key; additive across days
+        bins = np.clip(self.orders["lead_ns"].to_numpy() // BIN_NS, 0, N_BINS - 1).astype(np.int16)
+        groups = [self.orders[key] for key in keys] + [pd.Series(bins, name="bin")]
+        return self.orders["on_time"].groupby(groups, observed=True, dropna=False, sort=True).size().rename("count").reset_index()
+
+
+def histogram_percentiles(histogram, by=None, percentiles=PERCENTILES):
+    # Percentiles of the binned lead times per group, interpolating linearly inside the bin that holds each
+    # rank. Within about a bin width (6 hours) of the exact value for groups of a hundred or more orders;
+    # small groups can be further off, since the orders inside a bin are assumed evenly spread
+    keys = [by] if by else []
+    counts = histogram.groupby(keys + ["bin"], observed=True, dropna=False, sort=True)["count"].sum() if keys else histogram.groupby("bin", sort=True)["count"].sum()
+    if not len(counts):
+        return pd.DataFrame({f"lead_days_p{round(q * 100)}": [] for q in percentiles})
+    bins = (counts.index.get_level_values("bin") if keys else counts.index).to_numpy(np.float64)
+    count = counts.to_numpy(np.float64)
+
+    # Rows are sorted by group, so each group is one contiguous run
+    if keys:
+        group_codes = counts.index.codes[0]
+        first = np.flatnonzero(np.r_[True, group_codes[1:] != group_codes[:-1]])
+    else:
+        first = np.array([0])
+    cumulative = np.cumsum(count)
+    totals = np.add.reduceat(count, first)
+    starts = cumulative[first] - count[first]
+
+    result = {}
+    for q in percentiles:
+        # Rank q * (n - 1) as used by the exact percentiles, with each order centred in its unit of the count
+        target = starts + q * (totals - 1) + 0.5
+        row = np.minimum(np.searchsorted(cumulative, target, side="left"), len(count) - 1)
+        before = cumulative[row] - count[row]
+        result[f"lead_days_p{round(q * 100)}"] = (bins[row] + (target - before) / count[row]) * BIN_NS / NS_PER_DAY
+    return pd.DataFrame(result, index=counts.index.get_level_values(0)[first] if keys else ["all"])
+
+
+class DeliveryRollup:
+    # Daily SLA rollup keyed on the approval day: additive sums per day x ROLLUP_DIMENSIONS, lead-time
+    # histograms per day (overall and per dimension) for range percentiles, and the exact per-day
+    # percentiles, so date-range SLA views never touch the order rows. segments lists the store
+    # segments the rollup covers (see store.fold_segments).
+    def __init__(self, cells, histograms, daily, segments=None):
+        self.cells = cells
+        self.histograms = histograms
+        self._daily = daily
+        self.segments = list(segments or [])
+        self._cell_days = cells["day"].to_numpy()
+        self._histogram_days = {key: histogram["day"].to_numpy() for key, histogram in histograms.items()}
+
+    @classmethod
+    def from_table(cls, table):
+        cells = table._sums(["day"] + ROLLUP_DIMENSIONS).reset_index()
+        histograms = {"all": table.histogram(["day"])}
+        for by in ROLLUP_DIMENSIONS:
+            histograms[by] = table.histogram(["day", by])
+        return cls(cells, histograms, table.daily())
+
+    @classmethod
+    def from_frame(cls, df, date_col="order_approved_at"):
+        return cls.from_table(DeliveryTable.from_frame(df, date_col))
+
+    def merge(self, other, orders=None):
+        # Folds in a rollup of orders that are not in this one yet. Sums and histograms add up; exact
+        # percentiles do not, so the days both rollups hold are recomputed from orders(first, last),
+        # which must return every order approved in that range (e.g. TimeIndex.slice)
+        cells = merge_tail(self.cells, self._cell_days, other.cells, ["day"] + ROLLUP_DIMENSIONS, {col: "sum" for col in SUMS})
+        histograms = {}
+        for key, histogram in self.histograms.items():
+            keys = ["day"] + ([] if key == "all" else [key]) + ["bin"]
+            histograms[key] = merge_tail(histogram, self._histogram_days[key], other.histograms[key], keys, {"count": "sum"})
+
+        shared = self._daily.index.intersection(other._daily.index)
+        daily = pd.concat([self._daily, other._daily.drop(shared)])
+        if len(shared):
+            if orders is None:
+                raise ValueError("Merging rollups that share days needs their orders to recompute the exact percentiles")
+            first, last = shared.min(), shared.max()
+            recomputed = DeliveryTable.from_frame(orders(first, last)).daily()
+            daily = pd.concat([daily[(daily.index < first) | (daily.index > last)], recomputed])
+        return DeliveryRollup(cells, histograms, daily.sort_index(), self.segments + other.segments)
+
+    @classmethod
+    def load(cls, path):
+        with open(os.path.join(path, "rollup.json")) as f:
+            meta = json.load(f)
+        cells = pd.read_parquet(os.path.join(path, "cells.parquet"))
+        histograms = {key: pd.read_parquet(os.path.join(path, f"histogram_{key}.parquet")) for key in ["all"] + ROLLUP_DIMENSIONS}
+        daily = pd.read_parquet(os.path.join(path, "daily.parquet")).set_index("day")
+        return cls(cells, histograms, daily, meta["segments"])
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        frames = {"cells": self.cells, "daily": self._daily.reset_index()}
+        frames.update({f"histogram_{key}": histogram for key, histogram in self.histograms.items()})
+        for name, frame in frames.items():
+            tmp_path = os.path.join(path, f"{name}.parquet.tmp")
+            frame.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, os.path.join(path, f"{name}.parquet"))
+        # Written last, so the recorded segments never claim data the tables do not hold yet
+        with open(os.path.join(path, "rollup.json.tmp"), "w") as f:
+            json.dump({"segments": self.segments}, f)
+        os.replace(os.path.join(path, "rollup.json.tmp"), os.path.join(path, "rollup.json"))
+
+    @classmethod
+    def refresh(cls, path=DELIVERY_DIR, store_dir=store.STORE_DIR, orders=None):
+        # Like DailyCube.refresh. orders(first, last) serves the days a new segment shares with the
+        # rollup; by default they are read from the store.
+        if orders is None:
+            def orders(first, last):
+                df = store.load_store(store.MAIN_STORE, TABLE_COLUMNS, store_dir)
+                day = df["order_approved_at"].dt.normalize()
+                return df[(day >= first) & (day <= last)]
+
+        rollup = cls.load(path) if os.path.exists(os.path.join(path, "rollup.json")) else None
+        rollup, changed = store.fold_segments(
+            rollup, cls.from_frame, TABLE_COLUMNS, lambda rollup, part: rollup.merge(part, orders), store_dir=store_dir,
+        )
+        if changed:
+            rollup.save(path)
+        return rollup
+
+    @staticmethod
+    def _bounds(days, start_date, end_date):
+        lo = 0 if start_date is None else np.searchsorted(days, np.datetime64(pd.Timestamp(start_date).normalize()), side="left")
+        hi = len(days) if end_date is None else np.searchsorted(days, np.datetime64(pd.Timestamp(end_date).normalize()), side="right")
+        return lo, hi
+
+    def sla(self, by=None, start_date=None, end_date=None):
+        if by is not None and by not in ROLLUP_DIMENSIONS:
+            raise ValueError(f"{by} is not a rollup dimension")
+        lo, hi = self._bounds(self._cell_days, start_date, end_date)
+        cells = self.cells.iloc[lo:hi]
+        if by:
+            sums = cells.groupby(by, observed=True, dropna=False, sort=True)[SUMS].sum()
+        else:
+            sums = cells[SUMS].sum().to_frame("all").T
+        sla = _finish(sums)
+
+        key = by or "all"
+        lo, hi = self._bounds(self._histogram_days[key], start_date, end_date)
+        percentiles = histogram_percentiles(self.histograms[key].iloc[lo:hi], by)
+        return sla.join(percentiles) if len(sla) else sla.assign(**{col: [] for col in percentiles.columns})
+
+    def daily(self, start_date=None, end_date=None):
+        lo, hi = self._bounds(self._daily.index.to_numpy(), start_date, end_date)
+        return self._daily.iloc[lo:hi]
@@ -0,0 +1,54 @@
+import numpy as np
+
+# [lng_min, lng_max, lat_min, lat_max] covered by the Brazil background image
+BRAZIL_EXTENT = (-73.98283055, -33.8, -33.75116944, 5.4)
+
+
+class DensityPyramid:
+    # Customer coordinates binned once with np.histogram2d at base_resolution, plus coarser levels
+    # made by summing 2x2 blocks. Rendering only ever draws one small grid, whatever the point count.
+    def __init__(self, lng, lat, extent=BRAZIL_EXTENT, base_resolution=1024, levels=4):
+        if base_resolution % (1 << (levels - 1)):
+            raise ValueError("base_resolution must be divisible by 2 ** (levels - 1)")
+        self.extent = extent
+        lng_min, lng_max, lat_min, lat_max = extent
+        counts, _, _ = np.histogram2d(
+            np.asarray(lat, dtype=np.float64), np.asarray(lng, dtype=np.float64),
+            bins=base_resolution, range=[[lat_min, lat_max], [lng_min, lng_max]],
+        )
+        # Rows run south to north, so the grids are drawn with origin="lower"
+        self.levels = [counts.astype(np.float32)]
+        for _ in range(levels - 1):
+            grid = self.levels[-1]
+            rows, cols = grid.shape
+            self.levels.append(grid.reshape(rows // 2, 2, cols // 2, 2).sum(axis=(1, 3)))
+
+    @property
+    def total(self):
+        return float(self.levels[0].sum())
+
+    def level_for(self, bounds=None, target=256):
+        # Coarsest level that still gives at least `target` cells across the requested view
+        lng_min, lng_max, _, _ = self.extent
+        view = 1.0 if bounds is None else (bounds[1] - bounds[0]) / (lng_max - lng_min)
+        for level in range(len(self.levels) - 1, -1, -1):
+            if self.levels[level].shape[1] * view >= target:
+                return level
+        return 0
+
+    def tile(self, bounds=None, target=256):
+        level = self.level_for(bounds, target)
+        grid = self.levels[level]
+        if bounds is None:
+            return grid, self.extent
+
+        lng_min, lng_max, lat_min, lat_max = self.extent
+        rows, cols = grid.shape
+        col_size = (lng_max - lng_min) / cols
+        row_size = (lat_max - lat_min) / rows
+        c0 = int(np.clip(np.floor((bounds[0] - lng_min) / col_size), 0, cols - 1))
+        c1 = int(np.clip(np.ceil((bounds[1] - lng_min) / col_size), c0 + 1, cols))
+        r0 = int(np.clip(np.floor((bounds[2] - lat_min) / row_size), 0, rows - 1))
+        r1 = int(np.clip(np.ceil((bounds[3] - lat_min) / row_size), r0 + 1, rows))
+        extent = (lng_min + c0 * col_size, lng_min + c1 * col_size, lat_min + r0 * row_size, lat_min + r1 * row_size)
+        return grid[r0:r1, c0:c1], extent
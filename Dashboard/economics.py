@@ -0,0 +1,105 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+PRODUCT_KEYS = ["product_id", "product_category_name_english", "seller_id"]
+HEXBIN_GRIDSIZE = 14
+
+
+class ProductEconomics:
+    # Units sold and price sums per (product, category, seller) from one groupby over the order rows.
+    # The sums are additive, so category and seller filters re-aggregate this table, not the rows.
+    def __init__(self, cells):
+        self.cells = cells
+
+    @classmethod
+    def from_frame(cls, df):
+        cells = df.groupby(PRODUCT_KEYS, observed=True, dropna=False, sort=False).agg(
+            sales=("order_item_id", "sum"),
+            price_sum=("price", "sum"),
+            price_count=("price", "count"),
+        ).reset_index()
+        return cls(cells)
+
+    def __len__(self):
+        return len(self.cells)
+
+    def categories(self):
+        return sorted(self.cells["product_category_name_english"].dropna().astype(str).unique())
+
+    def product_revenue(self, categories=None, sellers=None):
+        # Same table as the original pivot_table: per product sell_probability (units sold over the
+        # number of products), mean price and revenue. The product count is taken before filtering, so a
+        # filtered view keeps each product's sell_probability and stays comparable with the full one.
+        products = max(self.cells["product_id"].nunique(), 1)
+        cells = self.cells
+        if categories is not None:
+            cells = cells[cells["product_category_name_english"].isin(categories)]
+        if sellers is not None:
+            cells = cells[cells["seller_id"].isin(sellers)]
+
+        product_revenue = cells.groupby("product_id", observed=True, sort=True)[["sales", "price_sum", "price_count"]].sum()
+        product_revenue = pd.DataFrame({
+            "sell_probability": product_revenue["sales"].to_numpy(dtype=np.float64) / products,
+            "price": product_revenue["price_sum"].to_numpy(dtype=np.float64) / product_revenue["price_count"].to_numpy(),
+            "total": product_revenue["sales"].to_numpy(dtype=np.float64) * (product_revenue["price_sum"] / product_revenue["price_count"]).to_numpy(),
+        }, index=product_revenue.index)
+        return product_revenue
+
+
+def _nonsingular(vmin, vmax, expander=0.1):
+    # Widen a degenerate range the way Axes.hexbin does before laying out the grid
+    if vmax - vmin <= 1e-15 * max(abs(vmin), abs(vmax), 1e-300):
+        if vmax == 0 and vmin == 0:
+            return -expander, expander
+        return vmin - expander * abs(vmin), vmax + expander * abs(vmax)
+    return vmin, vmax
+
+
+def log_hexbins(product_revenue, gridsize=HEXBIN_GRIDSIZE):
+    # Revenue summed per hexagon of log(sell_probability) x log(price), on the same lattice Axes.hexbin
+    # uses for linear axes. Returns one row per non-empty hexagon (its centre and total) plus the extent;
+    # drawing those centres with hexbin(C=total, extent=extent) reproduces the full plot.
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x = np.log(product_revenue["sell_probability"].to_numpy(dtype=np.float64))
+        y = np.log(product_revenue["price"].to_numpy(dtype=np.float64))
+    total = product_revenue["total"].to_numpy(dtype=np.float64)
+    keep = np.isfinite(x) & np.isfinite(y)
+    x, y, total = x[keep], y[keep], total[keep]
+    if not len(x):
+        return pd.DataFrame({"x": [], "y": [], "total": []}), (0.0, 1.0, 0.0, 1.0)
+
+    xmin, xmax = _nonsingular(x.min(), x.max())
+    ymin, ymax = _nonsingular(y.min(), y.max())
+    extent = (float(xmin), float(xmax), float(ymin), float(ymax))
+
+    nx = gridsize
+    ny = int(nx / math.sqrt(3))
+    padding = 1.e-9 * (xmax - xmin)
+    xmin -= padding
+    xmax += padding
+    sx = (xmax - xmin) / nx
+    sy = (ymax - ymin) / ny
+    ix = (x - xmin) / sx
+    iy = (y - ymin) / sy
+    ix1 = np.round(ix)
+    iy1 = np.round(iy)
+    ix2 = np.floor(ix)
+    iy2 = np.floor(iy)
+    on_first = (ix - ix1) ** 2 + 3.0 * (iy - iy1) ** 2 < (ix - ix2 - 0.5) ** 2 + 3.0 * (iy - iy2 - 0.5) ** 2
+
+    # Hexagon centres in data coordinates; the second lattice is offset by half a cell
+    cx = np.where(on_first, ix1, ix2 + 0.5) * sx + xmin
+    cy = np.where(on_first, iy1, iy2 + 0.5) * sy + ymin
+    cell = np.where(on_first, ix1 * (ny + 1) + iy1, (nx + 1) * (ny + 1) + ix2 * ny + iy2).astype(np.int64)
+
+    cells, inverse = np.unique(cell, return_inverse=True)
+    first = np.zeros(len(cells), dtype=np.int64)
+    first[inverse[::-1]] = np.arange(len(cell))[::-1]
+    bins = pd.DataFrame({
+        "x": cx[first],
+        "y": cy[first],
+        "total": np.bincount(inverse, weights=total, minlength=len(cells)),
+    })
+    return bins, extent
@@ -0,0 +1,238 @@
+import argparse
+import os
+import sqlite3
+import sys
+
+import numpy as np
+import pandas as pd
+
+import store
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+# Columns the engine aggregations read, and the measures they can compute
+ENGINE_COLUMNS = [
+    "order_approved_at", "order_id", "payment_value", "customer_id", "customer_state",
+    "product_id", "product_category_name_english", "review_score", "order_status",
+]
+TOTALS_BY = ["customer_state", "product_category_name_english", "review_score", "order_status"]
+DAILY_MEASURES = {"order_count": "COUNT(DISTINCT order_id)", "revenue": "COALESCE(SUM(payment_value), 0)"}
+TOTAL_MEASURES = {"order_count": "COUNT(*)", "item_count": "COUNT(product_id)", "customer_count": "COUNT(DISTINCT customer_id)"}
+
+NS_PER_DAY = 86_400_000_000_000
+
+
+def sqlite_path(store_dir=store.STORE_DIR):
+    # The SQLite copy lives next to the Feather store it was loaded from
+    return os.path.join(store_dir, store.MAIN_STORE + ".sqlite")
+
+
+class PandasEngine:
+    # Reference implementation: the aggregations over an in-memory frame that is already cut to the date range
+    name = "pandas"
+
+    def __init__(self, df):
+        self.df = df
+
+    def daily(self, measures=("order_count", "revenue")):
+        aggregations = {"order_count": ("order_id", "nunique"), "revenue": ("payment_value", "sum")}
+        return self.df.resample(rule="D", on="order_approved_at").agg(**{measure: aggregations[measure] for measure in measures})
+
+    def totals(self, by, measure="order_count"):
+        grouped = self.df.groupby(by, observed=True)
+        if measure == "item_count":
+            totals = grouped["product_id"].count()
+        elif measure == "customer_count":
+            totals = grouped["customer_id"].nunique()
+        else:
+            totals = grouped.size()
+        return totals.rename(measure)
+
+
+class OrdersDatabase:
+    # An embedded SQL store holding the ENGINE_COLUMNS of the merged table as the "orders" relation.
+    # DuckDB scans Parquet/Arrow in place with one thread per core and spills to disk past memory_limit;
+    # SQLite is the dependency-free fallback, loaded once into a file with an index on order_approved_at.
+    def __init__(self, connection, dialect, partitioned=False):
+        self.connection = connection
+        self.dialect = dialect
+        self.partitioned = partitioned
+
+    @classmethod
+    def duckdb(cls, store_dir=store.STORE_DIR, hive_dir=None, threads=None, memory_limit=None):
+        config = {}
+        if threads:
+            config["threads"] = threads
+        if memory_limit:
+            config["memory_limit"] = memory_limit
+            config["temp_directory"] = os.path.join(store_dir, "duckdb_tmp")
+        connection = duckdb.connect(config=config)
+        if hive_dir is not None:
+            # The month partition is exposed so range queries also prune directories
+            pattern = os.path.join(hive_dir, store.MAIN_STORE, "**", "*.parquet").replace("'", "''")
+            connection.execute(
+                f"CREATE VIEW orders AS SELECT {', '.join(ENGINE_COLUMNS)}, order_month "
+                f"FROM read_parquet('{pattern}', hive_partitioning = true)"
+            )
+            return cls(connection, "duckdb", partitioned=True)
+        table = store.read_table(store.MAIN_STORE, ENGINE_COLUMNS, store_dir)
+        connection.register("orders", table)
+        return cls(connection, "duckdb")
+
+    @classmethod
+    def sqlite(cls, path=None, store_dir=store.STORE_DIR):
+        path = path or sqlite_path(store_dir)
+        version = store.store_version(store.MAIN_STORE, store_dir)
+        connection = sqlite3.connect(path, check_same_thread=False)
+        current = connection.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'meta'").fetchone()
+        if current is None or connection.execute("SELECT version FROM meta").fetchone() != (version,):
+            load_sqlite(connection, store.load_store(store.MAIN_STORE, columns=ENGINE_COLUMNS, store_dir=store_dir), version)
+        return cls(connection, "sqlite")
+
+    @classmethod
+    def open(cls, store_dir=store.STORE_DIR, **kwargs):
+        if duckdb is not None:
+            return cls.duckdb(store_dir, **kwargs)
+        return cls.sqlite(store_dir=store_dir)
+
+    def bound(self, timestamp):
+        # SQLite keeps timestamps as int64 nanoseconds, DuckDB compares against datetimes
+        timestamp = pd.Timestamp(timestamp)
+        return timestamp.value if self.dialect == "sqlite" else timestamp.to_pydatetime()
+
+    def day(self):
+        if self.dialect == "sqlite":
+            return f"order_approved_at / {NS_PER_DAY} * {NS_PER_DAY}"
+        return "epoch_ns(date_trunc('day', order_approved_at))"
+
+    def query(self, sql, params=()):
+        if self.dialect == "sqlite":
+            return pd.read_sql_query(sql, self.connection, params=list(params))
+        return self.connection.execute(sql, list(params)).df()
+
+
+def load_sqlite(connection, df, version):
+    df = df.copy()
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(object)
+    approved = df["order_approved_at"]
+    df["order_approved_at"] = pd.Series(approved.to_numpy("datetime64[ns]").view(np.int64), index=df.index, dtype="Int64").mask(approved.isna())
+
+    with connection:
+        connection.execute("DROP TABLE IF EXISTS orders")
+        connection.execute("DROP TABLE IF EXISTS meta")
+        df.to_sql("orders", connection, index=False, chunksize=100_000)
+        connection.execute("CREATE INDEX orders_approved ON orders (order_approved_at)")
+        connection.execute("CREATE TABLE meta (version TEXT)")
+        connection.execute("INSERT INTO meta VALUES (?)", (version,))
+
+
+class SQLEngine:
+    # Same interface as PandasEngine, answered by one aggregate query over the date range
+    name = "sql"
+
+    def __init__(self, database, start_date=None, end_date=None):
+        self.database = database
+        self.start_date = start_date
+        self.end_date = end_date
+
+    def _where(self, extra=None):
+        conditions, params = [], []
+        if extra:
+            conditions.append(extra)
+        if self.start_date is not None:
+            start = pd.Timestamp(self.start_date).normalize()
+            conditions.append("order_approved_at >= ?")
+            params.append(self.database.bound(start))
+            if self.database.partitioned:
+                conditions.append("order_month >= ?")
+                params.append(start.strftime("%Y-%m"))
+        if self.end_date is not None:
+            end = pd.Timestamp(self.end_date).normalize()
+            conditions.append("order_approved_at < ?")
+            params.append(self.database.bound(end + pd.Timedelta(days=1)))
+            if self.database.partitioned:
+                conditions.append("order_month <= ?")
+                params.append(end.strftime("%Y-%m"))
+        return (" WHERE " + " AND ".join(conditions) if conditions else ""), params
+
+    def daily(self, measures=("order_count", "revenue")):
+        where, params = self._where("order_approved_at IS NOT NULL")
+        select = ", ".join(f"{DAILY_MEASURES[measure]} AS {measure}" for measure in measures)
+        daily_df = self.database.query(f"SELECT {self.database.day()} AS day, {select} FROM orders{where} GROUP BY 1 ORDER BY 1", params)
+
+        index = pd.DatetimeIndex(pd.to_datetime(daily_df["day"].astype(np.int64), unit="ns"), name="order_approved_at")
+        daily_df = daily_df[list(measures)].set_axis(index)
+        if "order_count" in daily_df:
+            daily_df["order_count"] = daily_df["order_count"].astype(np.int64)
+        if "revenue" in daily_df:
+            daily_df["revenue"] = daily_df["revenue"].astype(np.float64)
+        if len(daily_df):
+            daily_df = daily_df.asfreq("D", fill_value=0)
+        return daily_df
+
+    def totals(self, by, measure="order_count"):
+        if by not in TOTALS_BY:
+            raise ValueError(f"unknown dimension: {by}")
+        where, params = self._where(f"{by} IS NOT NULL")
+        totals = self.database.query(f"SELECT {by}, {TOTAL_MEASURES[measure]} AS {measure} FROM orders{where} GROUP BY 1 ORDER BY 1", params)
+        return totals.set_index(by)[measure].astype(np.int64)
+
+
+def crosscheck(reference, candidate, rtol=1e-9):
+    # Compares every engine aggregation; returns (name, error) for each mismatch. Group order is not
+    # compared, so both sides are sorted by key; float sums may differ in the last bits.
+    checks = {"daily": lambda engine: engine.daily()}
+    for by in TOTALS_BY:
+        checks[f"totals.{by}"] = lambda engine, by=by: engine.totals(by)
+    checks["totals.product_category_name_english.item_count"] = lambda engine: engine.totals("product_category_name_english", "item_count")
+    checks["totals.customer_state.customer_count"] = lambda engine: engine.totals("customer_state", "customer_count")
+
+    mismatches = []
+    for name, check in checks.items():
+        expected, actual = check(reference), check(candidate)
+        if not isinstance(expected, pd.DataFrame):
+            expected, actual = expected.to_frame(), actual.to_frame()
+        if not isinstance(expected.index, pd.DatetimeIndex):
+            expected = expected.set_axis(expected.index.astype(object)).sort_index()
+            actual = actual.set_axis(actual.index.astype(object)).sort_index()
+        try:
+            pd.testing.assert_frame_equal(expected, actual, check_dtype=False, check_index_type=False, check_freq=False, rtol=rtol)
+        except AssertionError as error:
+            mismatches.append((name, str(error)))
+    return mismatches
+
+
+if __name__ == "__main__":
+    from timeindex import TimeIndex, standard_ranges
+
+    parser = argparse.ArgumentParser(description="Cross-check the SQL engine against the pandas reference for every standard date range.")
+    parser.add_argument("--store", default=store.STORE_DIR, help="directory of the Feather store")
+    parser.add_argument("--backend", default="duckdb" if duckdb is not None else "sqlite", choices=["duckdb", "sqlite"])
+    parser.add_argument("--hive", default=None, help="query this partitioned dataset (see hive.py) instead of the Feather store; DuckDB only")
+    parser.add_argument("--periods", nargs="+", default=["all", "year", "quarter", "month"], choices=["all", "year", "quarter", "month"])
+    args = parser.parse_args()
+
+    if args.backend == "duckdb":
+        database = OrdersDatabase.duckdb(args.store, hive_dir=args.hive)
+    else:
+        database = OrdersDatabase.sqlite(store_dir=args.store)
+    all_df = store.load_store(store.MAIN_STORE, columns=ENGINE_COLUMNS, store_dir=args.store)
+    time_index = TimeIndex(all_df, "order_approved_at")
+
+    failed = 0
+    for label, start_date, end_date in standard_ranges(time_index.min, time_index.max, args.periods):
+        if label == "all":
+            start_date = end_date = None
+            reference = PandasEngine(all_df)
+        else:
+            reference = PandasEngine(time_index.slice(start_date, end_date))
+        for name, error in crosscheck(reference, SQLEngine(database, start_date, end_date)):
+            failed += 1
+            print(f"{label} {name}: {error}")
+    print(f"{args.backend}: {failed} mismatches")
+    sys.exit(1 if failed else 0)
@@ -1,81 +1,284 @@
-import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import assets
+import store
+from cache import cached
+from perf import timed
+from groupstats import grouped_t_interval
+from rfm import RFMTable
+from sketch import DEFAULT_PRECISION, grouped_distinct, precision_for_error
+from density import BRAZIL_EXTENT, DensityPyramid
+from economics import HEXBIN_GRIDSIZE, ProductEconomics, log_hexbins
+from engine import PandasEngine, SQLEngine
+from delivery import ROLLUP_DIMENSIONS, TABLE_COLUMNS as DELIVERY_COLUMNS, DeliveryTable
 
 class DataAnalyzer:
-    def __init__(self, df):
+    # With a DailyCube the date-range methods are answered from the rollup instead of self.df.
+    # Otherwise the daily, state, category, review and status aggregations go through self.engine:
+    # PandasEngine over self.df by default, or SQLEngine over an embedded database (see from_sql).
+    # A DeliveryRollup likewise answers the delivery SLA views for the date range.
+
+    # method -> columns of self.df it reads, so callers can load just those
+    COLUMNS = {
+        "create_daily_orders_df": ["order_approved_at", "order_id", "payment_value"],
+        "create_sum_spend_df": ["order_approved_at", "payment_value"],
+        "create_sum_order_items_df": ["product_category_name_english", "product_id"],
+        "review_score_df": ["review_score"],
+        "create_bystate_df": ["customer_state", "customer_id"],
+        "create_order_status": ["order_status"],
+        "create_product_economics": ["product_id", "product_category_name_english", "seller_id", "price", "order_item_id"],
+        "create_product_revenue_df": ["product_id", "product_category_name_english", "seller_id", "price", "order_item_id"],
+        "create_product_hexbins": ["product_id", "product_category_name_english", "seller_id", "price", "order_item_id"],
+        "create_customer_regions_df": ["customer_state", "payment_value"],
+        "create_rfm_df": ["customer_unique_id", "order_purchase_timestamp", "order_id", "payment_value"],
+        "create_delivery_table": DELIVERY_COLUMNS,
+        "create_delivery_sla_df": DELIVERY_COLUMNS,
+        "create_delivery_daily_df": DELIVERY_COLUMNS,
+    }
+
+    def __init__(self, df, cache=None, version=None, start_date=None, end_date=None, cube=None, engine=None, delivery=None, encoders=None):
         self.df = df
+        self.engine = engine if engine is not None else PandasEngine(df)
+        self.cache = cache
+        self.version = version
+        self.start_date = start_date
+        self.end_date = end_date
+        self.cube = cube
+        self.delivery = delivery
+        # KeyEncoders of a frame from schema.optimize_frame, to decode surrogate ID keys in results
+        self.encoders = encoders or {}
 
-    def create_daily_orders_df(self):
-        daily_orders_df = self.df.resample(rule='D', on='order_approved_at').agg({
-            "order_id": "nunique",
-            "payment_value": "sum"
-        })
+    @staticmethod
+    def _precision(error):
+        return DEFAULT_PRECISION if error is None else precision_for_error(error)
+
+    @classmethod
+    def from_time_index(cls, time_index, start_date=None, end_date=None, **kwargs):
+        return cls(time_index.slice(start_date, end_date), start_date=start_date, end_date=end_date, **kwargs)
+
+    @classmethod
+    def from_sql(cls, database, start_date=None, end_date=None, df=None, **kwargs):
+        # Only the engine aggregations are available unless a frame for the other methods is passed too
+        return cls(df, start_date=start_date, end_date=end_date, engine=SQLEngine(database, start_date, end_date), **kwargs)
+
+    @classmethod
+    def from_hive(cls, start_date=None, end_date=None, methods=None, states=None, base_dir=None, store_dir=None, **kwargs):
+        # Reads the partitioned dataset with the date range (and states) pushed down to partition and
+        # row-group pruning, decoding only the columns the given methods read. The dataset is written
+        # from the Feather store first if it is missing or older than the store.
+        import hive
+
+        base_dir = base_dir or hive.HIVE_DIR
+        hive.ensure_hive(store_dir or store.STORE_DIR, base_dir)
+        columns = None
+        if methods is not None:
+            columns = list(dict.fromkeys(col for method in methods for col in cls.COLUMNS[method]))
+        df = hive.load_range(start_date, end_date, columns, states, base_dir=base_dir)
+        return cls(df, start_date=start_date, end_date=end_date, **kwargs)
+
+    @timed()
+    @cached
+    def create_daily_orders_df(self, approximate=False, error=None):
+        if self.cube is not None:
+            daily_orders_df = self.cube.daily(self.start_date, self.end_date, ["order_count", "revenue"])
+            return daily_orders_df.reset_index()
+
+        if approximate:
+            rows = self.df[self.df['order_approved_at'].notna()]
+            rows = rows.assign(order_approved_at=rows['order_approved_at'].dt.normalize())
+            daily_orders_df = pd.DataFrame({
+                "order_count": grouped_distinct(rows, 'order_approved_at', 'order_id', self._precision(error)),
+                "revenue": rows.groupby('order_approved_at')['payment_value'].sum(),
+            })
+            daily_orders_df = daily_orders_df.asfreq('D', fill_value=0).reset_index()
+            return daily_orders_df
+
+        daily_orders_df = self.engine.daily(["order_count", "revenue"])
         daily_orders_df = daily_orders_df.reset_index()
-        daily_orders_df.rename(columns={
-            "order_id": "order_count",
-            "payment_value": "revenue"
-        }, inplace=True)
         
         return daily_orders_df
     
+    @timed()
+    @cached
     def create_sum_spend_df(self):
-        sum_spend_df = self.df.resample(rule='D', on='order_approved_at').agg({
-            "payment_value": "sum"
-        })
+        if self.cube is not None:
+            sum_spend_df = self.cube.daily(self.start_date, self.end_date, ["revenue"])
+            return sum_spend_df.reset_index().rename(columns={"revenue": "total_spend"})
+
+        sum_spend_df = self.engine.daily(["revenue"])
         sum_spend_df = sum_spend_df.reset_index()
         sum_spend_df.rename(columns={
-            "payment_value": "total_spend"
+            "revenue": "total_spend"
         }, inplace=True)
 
         return sum_spend_df
 
+    @timed()
+    @cached
     def create_sum_order_items_df(self):
-        sum_order_items_df = self.df.groupby("product_category_name_english")["product_id"].count().reset_index()
-        sum_order_items_df.rename(columns={
-            "product_id": "product_count"
-        }, inplace=True)
+        if self.cube is not None:
+            sum_order_items_df = self.cube.totals("product_category_name_english", self.start_date, self.end_date, "item_count").reset_index()
+            sum_order_items_df = sum_order_items_df[sum_order_items_df["item_count"] > 0]
+        else:
+            sum_order_items_df = self.engine.totals("product_category_name_english", "item_count").reset_index()
+        sum_order_items_df["product_category_name_english"] = sum_order_items_df["product_category_name_english"].astype(object)
+        sum_order_items_df.columns = ["product_category_name_english", "product_count"]
         sum_order_items_df = sum_order_items_df.sort_values(by='product_count', ascending=False)
 
         return sum_order_items_df
 
+    @timed()
+    @cached
     def review_score_df(self):
-        review_scores = self.df['review_score'].value_counts().sort_values(ascending=False)
+        if self.cube is not None:
+            review_scores = self.cube.totals("review_score", self.start_date, self.end_date).rename("count").sort_values(ascending=False)
+        else:
+            review_scores = self.engine.totals("review_score").rename("count").sort_values(ascending=False)
         most_common_score = review_scores.idxmax()
 
         return review_scores, most_common_score
 
-    def create_bystate_df(self):
-        bystate_df = self.df.groupby(by="customer_state").customer_id.nunique().reset_index()
-        bystate_df.rename(columns={
-            "customer_id": "customer_count"
-        }, inplace=True)
+    @timed()
+    @cached
+    def create_bystate_df(self, approximate=False, error=None):
+        if approximate and self.cube is not None:
+            # Estimated from the cube's per-day/per-month HyperLogLog sketches, at the cube's precision
+            bystate_df = self.cube.distinct_customers(self.start_date, self.end_date, "customer_state").reset_index()
+        elif approximate:
+            bystate_df = grouped_distinct(self.df, "customer_state", "customer_id", self._precision(error)).rename("customer_count").reset_index()
+            bystate_df["customer_state"] = bystate_df["customer_state"].astype(object)
+        else:
+            bystate_df = self.engine.totals("customer_state", "customer_count").reset_index()
+            bystate_df["customer_state"] = bystate_df["customer_state"].astype(object)
         most_common_state = bystate_df.loc[bystate_df['customer_count'].idxmax(), 'customer_state']
         bystate_df = bystate_df.sort_values(by='customer_count', ascending=False)
 
         return bystate_df, most_common_state
 
+    @timed()
+    @cached
     def create_order_status(self):
-        order_status_df = self.df["order_status"].value_counts().sort_values(ascending=False)
+        if self.cube is not None:
+            order_status_df = self.cube.totals("order_status", self.start_date, self.end_date)
+            order_status_df = order_status_df[order_status_df > 0]
+        else:
+            order_status_df = self.engine.totals("order_status")
+        order_status_df.index = order_status_df.index.astype(object)
+        order_status_df = order_status_df.rename("count").sort_values(ascending=False)
         most_common_status = order_status_df.idxmax()
 
         return order_status_df, most_common_status
+
+    @cached
+    def create_product_economics(self):
+        return ProductEconomics.from_frame(self.df)
+
+    @timed()
+    @cached
+    def create_product_revenue_df(self, categories=None, sellers=None):
+        # categories / sellers must be tuples so they can be part of the cache key
+        return self.create_product_economics().product_revenue(categories, sellers)
+
+    @timed()
+    @cached
+    def create_product_hexbins(self, categories=None, sellers=None, gridsize=HEXBIN_GRIDSIZE):
+        return log_hexbins(self.create_product_revenue_df(categories, sellers), gridsize)
+
+    @timed()
+    @cached
+    def create_customer_regions_df(self, by='customer_state', confidence=0.95):
+        # by is a column name or a Series aligned with self.df (e.g. a zip prefix); the group column comes first
+        customer_regions = grouped_t_interval(self.df, by, 'payment_value', confidence)
+        group_col = customer_regions.columns[0]
+        customer_regions = customer_regions.rename(columns={
+            'mean': 'mean_payment_value',
+            'std': 'std_payment_value',
+            'count': 'count_customers'
+        })
+
+        return customer_regions[[group_col, 'mean_payment_value', 'std_payment_value', 'count_customers', 'ci_low', 'ci_hi']]
+
+    @timed()
+    @cached
+    def create_rfm_df(self, as_of=None):
+        rfm_df = RFMTable.from_orders(self.df).scores(as_of)
+        segment_counts = rfm_df['segment'].value_counts().sort_values(ascending=False)
+
+        return rfm_df, segment_counts
+
+    @cached
+    def create_delivery_table(self):
+        return DeliveryTable.from_frame(self.df)
+
+    @timed()
+    @cached
+    def create_delivery_sla_df(self, by='customer_state'):
+        # by=None gives a single row for the whole range. Sellers are never in the rollup, so that
+        # breakdown always comes from the order rows.
+        if self.delivery is not None and (by is None or by in ROLLUP_DIMENSIONS):
+            sla_df = self.delivery.sla(by, self.start_date, self.end_date)
+        else:
+            sla_df = self.create_delivery_table().sla(by)
+        if by is None:
+            return sla_df
+        sla_df = sla_df.reset_index()
+        if by in self.encoders:
+            sla_df[by] = self.encoders[by].decode(sla_df[by].array)
+        else:
+            sla_df[by] = sla_df[by].astype(object)
+
+        return sla_df.sort_values(by='orders', ascending=False)
+
+    @timed()
+    @cached
+    def create_delivery_daily_df(self):
+        if self.delivery is not None:
+            delivery_daily_df = self.delivery.daily(self.start_date, self.end_date)
+        else:
+            delivery_daily_df = self.create_delivery_table().daily()
+
+        return delivery_daily_df.reset_index()
     
 class BrazilMapPlotter:
-    def __init__(self, data, plt, mpimg, urllib, st):
+    def __init__(self, data, plt, st, density=None):
         self.data = data
         self.plt = plt
-        self.mpimg = mpimg
-        self.urllib = urllib
         self.st = st
+        self.density = density
+
+    def background(self):
+        # Never downloads: until the background is bundled or cached (see assets.prefetch) the
+        # density layer is drawn on its own
+        return assets.image("brazil_map")
+
+    def get_density(self):
+        if self.density is None:
+            self.density = DensityPyramid(self.data["geolocation_lng"].to_numpy(), self.data["geolocation_lat"].to_numpy())
+        return self.density
+
+    @timed("BrazilMapPlotter.figure")
+    def figure(self, bounds=None, resolution=256):
+        from matplotlib.colors import LogNorm
+
+        grid, extent = self.get_density().tile(bounds, resolution)
+        brazil = self.background()
 
-    def plot(self):
-        brazil = self.mpimg.imread(self.urllib.request.urlopen('https://i.pinimg.com/originals/3a/0c/e1/3a0ce18b3c842748c255bc0aa445ad41.jpg'), 'jpg')
-    
         # Create figure and axis explicitly
-        fig, ax = plt.subplots(figsize=(10, 10))
-    
-        self.data.plot(kind="scatter", x="geolocation_lng", y="geolocation_lat", ax=ax, alpha=0.3, s=0.3, c='maroon')
-        ax.imshow(brazil, extent=[-73.98283055, -33.8, -33.75116944, 5.4])
+        fig, ax = self.plt.subplots(figsize=(10, 10))
+
+        if brazil is not None:
+            ax.imshow(brazil, extent=BRAZIL_EXTENT)
+        ax.imshow(np.ma.masked_equal(grid, 0), extent=extent, origin='lower', cmap='Reds', norm=LogNorm(), alpha=0.8, interpolation='nearest')
+        if bounds is not None:
+            ax.set_xlim(bounds[0], bounds[1])
+            ax.set_ylim(bounds[2], bounds[3])
         ax.axis('off')  # Turn off the axis
-    
+
+        return fig
+
+    def plot(self, bounds=None, resolution=256):
+        fig = self.figure(bounds, resolution)
+
         # Pass the figure object to st.pyplot
         self.st.pyplot(fig)
+        self.plt.close(fig)
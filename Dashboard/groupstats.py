@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+
+
+def grouped_t_interval(df, by, value, confidence=0.95):
+    # Mean, SEM and Student-t interval for every group in one pass; groups with fewer than two values get NaN bounds
+    # scipy takes most of a second to import, so it is only loaded once an interval is needed
+    import scipy.stats as stats
+
+    grouped = df.groupby(by, observed=True)[value].agg(["mean", "std", "count"])
+    count = grouped["count"].to_numpy()
+    sem = grouped["std"].to_numpy() / np.sqrt(count)
+    with np.errstate(invalid="ignore"):
+        t = stats.t.ppf((1 + confidence) / 2, np.where(count > 1, count - 1, np.nan))
+    grouped["sem"] = sem
+    grouped["ci_low"] = grouped["mean"].to_numpy() - t * sem
+    grouped["ci_hi"] = grouped["mean"].to_numpy() + t * sem
+    return grouped.reset_index()
+
+
+def grouped_bootstrap_ci(df, by, value, confidence=0.95, n_boot=1000, seed=None, max_batch_elements=10_000_000):
+    # Percentile bootstrap of the group means. Replicates are drawn in batches of (replicates x rows)
+    # and summed per group with np.add.reduceat, so memory stays at max_batch_elements floats.
+    valid = df[df[value].notna()]
+    grouper = valid.groupby(by, observed=True, sort=True)
+    codes = grouper.ngroup()
+    labels = grouper.size().index
+
+    # Rows with a missing group key (e.g. no customer_state after the left merges) get a NaN code
+    keep = codes.notna().to_numpy()
+    codes = codes.to_numpy()[keep].astype(np.int64)
+    order = np.argsort(codes, kind="stable")
+    values = valid[value].to_numpy(dtype=np.float64)[keep][order]
+    counts = np.bincount(codes, minlength=len(labels))
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    element_start = np.repeat(starts, counts)
+    element_count = np.repeat(counts, counts)
+
+    rng = np.random.default_rng(seed)
+    batch = max(1, max_batch_elements // max(len(values), 1))
+    means = np.empty((n_boot, len(labels)))
+    for lo in range(0, n_boot, batch):
+        hi = min(lo + batch, n_boot)
+        picks = element_start + (rng.random((hi - lo, len(values))) * element_count).astype(np.int64)
+        means[lo:hi] = np.add.reduceat(values[picks], starts, axis=1) / counts
+
+    alpha = (1 - confidence) / 2
+    ci_low, ci_hi = np.quantile(means, [alpha, 1 - alpha], axis=0)
+    result = pd.DataFrame({
+        "mean": np.add.reduceat(values, starts) / counts,
+        "count": counts,
+        "ci_low": np.where(counts > 1, ci_low, np.nan),
+        "ci_hi": np.where(counts > 1, ci_hi, np.nan),
+    }, index=labels)
+    return result.reset_index()
@@ -0,0 +1,131 @@
+import argparse
+import os
+import shutil
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+import store
+
+HIVE_DIR = os.path.join(store.STORE_DIR, "hive")
+DATE_COL = "order_approved_at"
+MONTH_COL = "order_month"
+PARTITION_COLS = [MONTH_COL, "customer_state"]
+PARTITIONING = ds.partitioning(pa.schema([(MONTH_COL, pa.string()), ("customer_state", pa.string())]), flavor="hive")
+
+# Row groups are sorted by DATE_COL, so their min/max statistics also prune inside a month
+ROWS_PER_GROUP = 64 * 1024
+# Version of the Feather store the dataset was written from; "_" keeps it out of dataset discovery
+VERSION_FILE = "_store_version"
+
+
+def dataset_path(name=store.MAIN_STORE, base_dir=HIVE_DIR):
+    return os.path.join(base_dir, name)
+
+
+def write_hive(table, name=store.MAIN_STORE, base_dir=HIVE_DIR, version=None):
+    # order_month=YYYY-MM/customer_state=XX/part-N.parquet; rows without an approval date land in the null partition
+    table = table.sort_by(DATE_COL)
+    table = table.append_column(MONTH_COL, pc.strftime(table.column(DATE_COL), format="%Y-%m"))
+    table = table.set_column(table.schema.get_field_index("customer_state"), "customer_state", table.column("customer_state").cast(pa.string()))
+
+    path = dataset_path(name, base_dir)
+    tmp_path = path + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    ds.write_dataset(
+        table, tmp_path, format="parquet", partitioning=PARTITIONING,
+        max_rows_per_group=ROWS_PER_GROUP, min_rows_per_group=min(ROWS_PER_GROUP, 1024),
+        file_options=ds.ParquetFileFormat().make_write_options(compression="zstd"),
+    )
+    if version is not None:
+        with open(os.path.join(tmp_path, VERSION_FILE), "w") as f:
+            f.write(version)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+    return path
+
+
+def build_hive(store_dir=store.STORE_DIR, base_dir=HIVE_DIR, name=store.MAIN_STORE):
+    store.ensure_store(store_dir=store_dir)
+    version = store.store_version(name, store_dir)
+    return write_hive(store.read_table(name, store_dir=store_dir), name, base_dir, version)
+
+
+def hive_version(name=store.MAIN_STORE, base_dir=HIVE_DIR):
+    try:
+        with open(os.path.join(dataset_path(name, base_dir), VERSION_FILE)) as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def ensure_hive(store_dir=store.STORE_DIR, base_dir=HIVE_DIR, name=store.MAIN_STORE):
+    # (Re)written when missing or when the Feather store was rebuilt or refreshed since
+    store.ensure_store(store_dir=store_dir)
+    if hive_version(name, base_dir) != store.store_version(name, store_dir):
+        build_hive(store_dir, base_dir, name)
+
+
+def range_filter(start_date=None, end_date=None, states=None):
+    # Month bounds prune whole partitions; the timestamp bounds prune row groups inside them
+    expression = None
+
+    def both(left, right):
+        return right if left is None else left & right
+
+    if start_date is not None:
+        start = pd.Timestamp(start_date).normalize()
+        expression = both(expression, ds.field(MONTH_COL) >= start.strftime("%Y-%m"))
+        expression = both(expression, ds.field(DATE_COL) >= start.to_pydatetime())
+    if end_date is not None:
+        end = pd.Timestamp(end_date).normalize()
+        expression = both(expression, ds.field(MONTH_COL) <= end.strftime("%Y-%m"))
+        expression = both(expression, ds.field(DATE_COL) < (end + pd.Timedelta(days=1)).to_pydatetime())
+    if states is not None:
+        expression = both(expression, ds.field("customer_state").isin(list(states)))
+    return expression
+
+
+def open_hive(name=store.MAIN_STORE, base_dir=HIVE_DIR):
+    return ds.dataset(dataset_path(name, base_dir), format="parquet", partitioning=PARTITIONING)
+
+
+def load_range(start_date=None, end_date=None, columns=None, states=None, name=store.MAIN_STORE, base_dir=HIVE_DIR):
+    # Only the requested columns are decoded; filter columns are read for pruning but not returned
+    dataset = open_hive(name, base_dir)
+    table = dataset.to_table(columns=columns, filter=range_filter(start_date, end_date, states))
+    if MONTH_COL in table.column_names and (columns is None or MONTH_COL not in columns):
+        table = table.drop_columns([MONTH_COL])
+    return store.apply_dtypes(table.to_pandas(split_blocks=True, self_destruct=True))
+
+
+def scanned_bytes(start_date=None, end_date=None, columns=None, states=None, name=store.MAIN_STORE, base_dir=HIVE_DIR):
+    # Compressed bytes of the column chunks a load_range call would read, after partition and row-group pruning
+    dataset = open_hive(name, base_dir)
+    expression = range_filter(start_date, end_date, states)
+    wanted = set(columns or dataset.schema.names)
+    if expression is not None:
+        wanted |= {DATE_COL}
+    total = 0
+    for fragment in dataset.get_fragments(filter=expression):
+        for row_group in fragment.split_by_row_group(filter=expression, schema=dataset.schema):
+            metadata = row_group.metadata
+            for index in row_group.row_groups:
+                group = metadata.row_group(index.id)
+                for column in range(group.num_columns):
+                    chunk = group.column(column)
+                    if chunk.path_in_schema in wanted:
+                        total += chunk.total_compressed_size
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write the merged table as a Parquet dataset partitioned by approval month and customer state.")
+    parser.add_argument("--store", default=store.STORE_DIR, help="directory of the Feather store to convert")
+    parser.add_argument("--out", default=HIVE_DIR, help="output directory for the partitioned dataset")
+    args = parser.parse_args()
+
+    path = build_hive(args.store, args.out)
+    print(f"Wrote {len(open_hive(base_dir=args.out).files)} files to {path}")
@@ -0,0 +1,108 @@
+import contextlib
+import cProfile
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+
+# DASHBOARD_PERF=1 turns instrumentation on. When it is off, timed() returns functions unchanged
+# and stage() hands back one shared no-op context, so the hooks cost nothing.
+ENABLED = os.environ.get("DASHBOARD_PERF", "").lower() in ("1", "true", "yes", "on")
+# Optional exports: append every stage record to a JSON lines file / dump a cProfile file per rerun
+JSONL_PATH = os.environ.get("DASHBOARD_PERF_JSONL")
+PROFILE_DIR = os.environ.get("DASHBOARD_PERF_PROFILE")
+
+_NULL_STAGE = contextlib.nullcontext()
+_local = threading.local()
+
+
+def _rss():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+def _rows(result):
+    if isinstance(result, tuple) and result:
+        result = result[0]
+    if hasattr(result, "__len__") and not isinstance(result, (str, bytes)):
+        return len(result)
+    return None
+
+
+class Stage:
+    def __init__(self, name, rows=None):
+        self.name = name
+        self.rows = rows
+
+    def __enter__(self):
+        self.rss = _rss()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self.start
+        records = getattr(_local, "records", None)
+        if records is not None:
+            records.append({
+                "stage": self.name,
+                "wall_ms": wall * 1000,
+                "rows": self.rows,
+                "mem_delta_mb": (_rss() - self.rss) / 2 ** 20,
+            })
+        return False
+
+
+def stage(name, rows=None):
+    # with stage("filter") as s: ...; s.rows = len(df)
+    return Stage(name, rows) if ENABLED else _NULL_STAGE
+
+
+def timed(name=None):
+    def decorate(fn):
+        if not ENABLED:
+            return fn
+        label = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with Stage(label) as current:
+                result = fn(*args, **kwargs)
+                current.rows = _rows(result)
+            return result
+        return wrapper
+    return decorate
+
+
+def start_run():
+    if not ENABLED:
+        return
+    _local.run_id = uuid.uuid4().hex[:12]
+    _local.started = time.time()
+    _local.records = []
+    _local.profiler = None
+    if PROFILE_DIR:
+        _local.profiler = cProfile.Profile()
+        _local.profiler.enable()
+
+
+def end_run():
+    # Returns this rerun's stage records and writes the optional exports
+    if not ENABLED or getattr(_local, "records", None) is None:
+        return []
+    records, _local.records = _local.records, None
+    records.append({"stage": "total", "wall_ms": (time.time() - _local.started) * 1000, "rows": None, "mem_delta_mb": None})
+
+    if _local.profiler is not None:
+        _local.profiler.disable()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        _local.profiler.dump_stats(os.path.join(PROFILE_DIR, f"run-{int(_local.started)}-{_local.run_id}.prof"))
+    if JSONL_PATH:
+        with open(JSONL_PATH, "a") as f:
+            for record in records:
+                f.write(json.dumps({"run": _local.run_id, "time": _local.started, **record}) + "\n")
+    return records
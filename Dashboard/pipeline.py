@@ -0,0 +1,171 @@
+import argparse
+import math
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import store
+
+PARTS_DIR = os.path.join(store.STORE_DIR, "parts")
+
+# Target size of the raw input that lands in one bucket; every bucket is joined in memory on its own
+BUCKET_BYTES = 64 * 1024 * 1024
+
+
+def bucket_of(keys, n_buckets):
+    return (pd.util.hash_array(np.asarray(keys, dtype=object)) % np.uint64(n_buckets)).astype(np.int64)
+
+
+class BucketWriter:
+    # Hash-partitions chunks on a key column into one directory of small Parquet files per bucket
+    def __init__(self, root, name, n_buckets):
+        self.root = os.path.join(root, name)
+        self.n_buckets = n_buckets
+        self.columns = None
+        self.chunks = 0
+
+    def write(self, df, key):
+        if self.columns is None:
+            self.columns = list(df.columns)
+        for bucket, part in df.groupby(bucket_of(df[key], self.n_buckets)):
+            path = os.path.join(self.root, f"{bucket:05d}")
+            os.makedirs(path, exist_ok=True)
+            part.to_parquet(os.path.join(path, f"{self.chunks:06d}.parquet"), index=False)
+        self.chunks += 1
+
+    def read(self, bucket):
+        path = os.path.join(self.root, f"{bucket:05d}")
+        if not os.path.isdir(path):
+            return pd.DataFrame(columns=self.columns or [])
+        return pd.concat([pd.read_parquet(os.path.join(path, name)) for name in sorted(os.listdir(path))], ignore_index=True)
+
+
+def read_chunks(dataset_dir, key, chunksize):
+    path = os.path.join(dataset_dir, store.RAW_FILES[key])
+    return pd.read_csv(path, chunksize=chunksize, parse_dates=store.RAW_DATETIME_COLS.get(key, []))
+
+
+def default_buckets(dataset_dir):
+    fact_bytes = sum(os.path.getsize(os.path.join(dataset_dir, store.RAW_FILES[key])) for key in ("orders", "items", "payments", "reviews", "customers"))
+    return max(1, math.ceil(fact_bytes / BUCKET_BYTES))
+
+
+def read_geolocation(dataset_dir, chunksize, tmp_dir=None):
+    # The raw geolocation rows are not bounded by the number of zip codes, only the silver table is.
+    # Hash-partition them on the zip prefix so each prefix is deduplicated and aggregated (medians
+    # included) within one bucket, and only the per-prefix result is kept in memory.
+    n_buckets = max(1, math.ceil(os.path.getsize(os.path.join(dataset_dir, store.RAW_FILES["geo"])) / BUCKET_BYTES))
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as tmp:
+        geo = BucketWriter(tmp, "geo", n_buckets)
+        for chunk in read_chunks(dataset_dir, "geo", chunksize):
+            geo.write(chunk.drop_duplicates(), "geolocation_zip_code_prefix")
+        silver = [store.build_geolocation_silver(geo.read(bucket)) for bucket in range(n_buckets)]
+    return pd.concat(silver, ignore_index=True).sort_values("geolocation_zip_code_prefix", kind="stable", ignore_index=True)
+
+
+def read_dimensions(dataset_dir, chunksize, tmp_dir=None):
+    sellers = pd.read_csv(os.path.join(dataset_dir, store.RAW_FILES["sellers"]))
+    category = pd.read_csv(os.path.join(dataset_dir, store.RAW_FILES["category"]))
+    products = pd.read_csv(os.path.join(dataset_dir, store.RAW_FILES["products"]))
+    product_df = store.clean_products(products).merge(category, how="left", on="product_category_name")
+    return sellers, product_df, read_geolocation(dataset_dir, chunksize, tmp_dir)
+
+
+class PartWriter:
+    def __init__(self, out_dir, name, columns):
+        self.path = os.path.join(out_dir, name)
+        self.schema = store.arrow_schema(columns)
+        os.makedirs(self.path, exist_ok=True)
+        # Numbering continues after any parts already in the directory, so appends never overwrite them
+        self.parts = len([name for name in os.listdir(self.path) if name.startswith("part-")])
+
+    def write(self, df):
+        if df.empty:
+            return
+        table = pa.Table.from_pandas(store.apply_dtypes(df[self.schema.names]), preserve_index=False).cast(self.schema)
+        pq.write_table(table, os.path.join(self.path, f"part-{self.parts:05d}.parquet"))
+        self.parts += 1
+
+
+def build_partitioned(dataset_dir=store.DATASET_DIR, out_dir=PARTS_DIR, chunksize=200_000, n_buckets=None, tmp_dir=None):
+    # Grace hash join of the Olist fact tables. Peak memory is one input chunk or one bucket,
+    # whichever is larger, plus the small dimension tables.
+    n_buckets = n_buckets or default_buckets(dataset_dir)
+    sellers, product_df, geolocation_silver = read_dimensions(dataset_dir, chunksize, tmp_dir)
+
+    for name in (store.MAIN_STORE, store.GEO_STORE):
+        shutil.rmtree(os.path.join(out_dir, name), ignore_errors=True)
+    main_writer = PartWriter(out_dir, store.MAIN_STORE, store.MAIN_COLUMNS)
+    geo_writer = PartWriter(out_dir, store.GEO_STORE, store.GEO_COLUMNS)
+
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as tmp:
+        orders = BucketWriter(tmp, "orders", n_buckets)
+        order_keys = BucketWriter(tmp, "order_keys", n_buckets)
+        for chunk in read_chunks(dataset_dir, "orders", chunksize):
+            chunk = chunk[~chunk["order_id"].isin(store.undelivered_order_ids(chunk))]
+            orders.write(store.clean_orders(chunk), "order_id")
+            order_keys.write(chunk[["customer_id", "order_id"]], "customer_id")
+
+        customers = BucketWriter(tmp, "customers", n_buckets)
+        for chunk in read_chunks(dataset_dir, "customers", chunksize):
+            customers.write(chunk, "customer_id")
+
+        # Re-key customers by the delivered orders that reference them, so every later join is on order_id
+        order_customers = BucketWriter(tmp, "order_customers", n_buckets)
+        for bucket in range(n_buckets):
+            joined = customers.read(bucket).merge(order_keys.read(bucket), on="customer_id", how="inner")
+            if not joined.empty:
+                order_customers.write(joined, "order_id")
+
+        items = BucketWriter(tmp, "items", n_buckets)
+        payments = BucketWriter(tmp, "payments", n_buckets)
+        reviews = BucketWriter(tmp, "reviews", n_buckets)
+        for key, writer in (("items", items), ("payments", payments), ("reviews", reviews)):
+            for chunk in read_chunks(dataset_dir, key, chunksize):
+                writer.write(store.clean_reviews(chunk) if key == "reviews" else chunk, "order_id")
+
+        for bucket in range(n_buckets):
+            bucket_orders = orders.read(bucket)
+            delivered = bucket_orders["order_id"]
+            bucket_customers = order_customers.read(bucket).drop(columns="order_id").drop_duplicates("customer_id")
+            bucket_payments = payments.read(bucket)
+            bucket_reviews = reviews.read(bucket)
+            bucket_items = items.read(bucket)
+
+            all_df, silver_df = store.merge_tables(
+                bucket_customers, bucket_orders,
+                bucket_payments[bucket_payments["order_id"].isin(delivered)],
+                bucket_reviews[bucket_reviews["order_id"].isin(delivered)],
+                bucket_items[bucket_items["order_id"].isin(delivered)],
+                sellers, product_df, geolocation_silver,
+            )
+            main_writer.write(all_df)
+            geo_writer.write(silver_df)
+
+    return main_writer.parts
+
+
+def load_partitioned(name, columns=None, parts_dir=PARTS_DIR):
+    table = pq.read_table(os.path.join(parts_dir, name), columns=columns)
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream the raw Olist CSVs into partitioned Parquet tables with bounded memory.")
+    parser.add_argument("--dataset", default=store.DATASET_DIR, help="directory with the raw Olist CSV files")
+    parser.add_argument("--out", default=PARTS_DIR, help="output directory for the partitioned tables")
+    parser.add_argument("--chunksize", type=int, default=200_000, help="rows read from each CSV at a time")
+    parser.add_argument("--buckets", type=int, default=None, help="number of order_id hash buckets (default: sized from the input)")
+    parser.add_argument("--tmp", default=None, help="directory for the intermediate bucket files")
+    parser.add_argument("--store", action="store_true", help="also write the Feather store the dashboard loads")
+    args = parser.parse_args()
+
+    build_partitioned(args.dataset, args.out, args.chunksize, args.buckets, args.tmp)
+    if args.store:
+        for name in (store.MAIN_STORE, store.GEO_STORE):
+            store.write_store(load_partitioned(name, parts_dir=args.out), name)
@@ -0,0 +1,118 @@
+import argparse
+import json
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+import store
+from function import DataAnalyzer
+from schema import decode_frame, optimize_frame
+from timeindex import standard_ranges
+
+# report name -> DataAnalyzer method; each task loads only DataAnalyzer.COLUMNS[method]
+ANALYSES = {
+    "daily_orders": "create_daily_orders_df",
+    "sum_spend": "create_sum_spend_df",
+    "order_items": "create_sum_order_items_df",
+    "review_score": "review_score_df",
+    "bystate": "create_bystate_df",
+    "order_status": "create_order_status",
+    "product_revenue": "create_product_revenue_df",
+    "customer_regions": "create_customer_regions_df",
+}
+
+# Per-process state: the memory-mapped base table, its sorted order_approved_at values and the key encoders
+_table = None
+_approved = None
+_encoders = None
+
+
+def write_shared_table(df, path):
+    # Uncompressed Arrow IPC so every worker maps the same pages instead of receiving a pickled copy
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    with pa.OSFile(path, "wb") as sink, ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+
+
+def _init_worker(path, encoders):
+    global _table, _approved, _encoders
+    _encoders = encoders
+    _table = ipc.open_file(pa.memory_map(path, "r")).read_all()
+    approved = _table.column("order_approved_at")
+    _approved = approved.slice(0, len(approved) - approved.null_count).to_numpy()
+
+
+def _run(task):
+    label, start_date, end_date, name = task
+    method = ANALYSES[name]
+    lo = int(np.searchsorted(_approved, np.datetime64(start_date, "ns"), side="left"))
+    hi = int(np.searchsorted(_approved, np.datetime64(end_date, "ns") + np.timedelta64(1, "D"), side="left"))
+    df = _table.slice(lo, max(hi - lo, 0)).select(DataAnalyzer.COLUMNS[method]).to_pandas()
+    if df.empty:
+        return label, name, None
+    return label, name, getattr(DataAnalyzer(df, start_date=start_date, end_date=end_date, encoders=_encoders), method)()
+
+
+def _to_json(value):
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def write_result(out_dir, label, name, result, summary, encoders=None):
+    directory = os.path.join(out_dir, label)
+    os.makedirs(directory, exist_ok=True)
+    if isinstance(result, tuple):
+        result, most_common = result
+        summary[f"{name}_most_common"] = _to_json(most_common)
+    if not hasattr(result, "to_frame") or hasattr(result, "columns"):
+        frame = result
+    else:
+        frame = result.to_frame()
+    # Reports keyed on an ID are written with the original IDs, not the shared table's surrogate codes
+    frame = decode_frame(frame, encoders or {})
+    frame.to_parquet(os.path.join(directory, f"{name}.parquet"))
+
+
+def precompute_reports(out_dir, periods=("month", "quarter"), analyses=None, workers=None, store_dir=store.STORE_DIR):
+    analyses = list(analyses or ANALYSES)
+    store.ensure_store(store_dir=store_dir)
+    all_df, encoders = optimize_frame(store.load_store(store.MAIN_STORE, store_dir=store_dir))
+    approved = all_df["order_approved_at"]
+    ranges = standard_ranges(approved.min(), approved.max(), periods)
+    tasks = [(label, start_date, end_date, name) for label, start_date, end_date in ranges for name in analyses]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        shared_path = os.path.join(tmp, store.MAIN_STORE + ".arrow")
+        write_shared_table(all_df, shared_path)
+        del all_df, approved
+
+        summaries = {label: {"start_date": str(start_date), "end_date": str(end_date)} for label, start_date, end_date in ranges}
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(shared_path, encoders)) as pool:
+            for label, name, result in pool.map(_run, tasks, chunksize=max(1, len(tasks) // (8 * (workers or os.cpu_count() or 1)))):
+                if result is not None:
+                    write_result(out_dir, label, name, result, summaries[label], encoders)
+
+    for label, summary in summaries.items():
+        if os.path.isdir(os.path.join(out_dir, label)):
+            with open(os.path.join(out_dir, label, "summary.json"), "w") as f:
+                json.dump(summary, f, indent=2)
+    return summaries
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute DataAnalyzer reports for every month/quarter/year in parallel.")
+    parser.add_argument("--out", required=True, help="output directory; one sub-directory of Parquet files per date range")
+    parser.add_argument("--periods", nargs="+", default=["month", "quarter"], choices=["all", "year", "quarter", "month"])
+    parser.add_argument("--analyses", nargs="+", default=None, choices=list(ANALYSES))
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument("--clean", action="store_true", help="remove the output directory first")
+    args = parser.parse_args()
+
+    if args.clean:
+        shutil.rmtree(args.out, ignore_errors=True)
+    summaries = precompute_reports(args.out, args.periods, args.analyses, args.workers)
+    print(f"Wrote reports for {len(summaries)} date ranges to {args.out}")
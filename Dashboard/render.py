@@ -0,0 +1,150 @@
+import argparse
+import hashlib
+import io
+import os
+
+import numpy as np
+import pandas as pd
+
+import charts
+from cache import ResultCache
+from perf import stage
+from timeindex import standard_ranges
+
+
+def _update(digest, value):
+    if isinstance(value, pd.DataFrame):
+        digest.update(repr(("DataFrame", value.shape, list(value.columns))).encode())
+        digest.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    elif isinstance(value, pd.Series):
+        digest.update(repr(("Series", value.shape, value.name)).encode())
+        digest.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    elif isinstance(value, np.ndarray):
+        digest.update(repr(("ndarray", value.dtype.str, value.shape)).encode())
+        digest.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, (tuple, list)):
+        digest.update(repr((type(value).__name__, len(value))).encode())
+        for item in value:
+            _update(digest, item)
+    elif isinstance(value, dict):
+        for key in sorted(value):
+            digest.update(repr(key).encode())
+            _update(digest, value[key])
+    else:
+        digest.update(repr(value).encode())
+
+
+def fingerprint(*values):
+    digest = hashlib.blake2b(digest_size=16)
+    for value in values:
+        _update(digest, value)
+    return digest.hexdigest()
+
+
+def figure_bytes(fig, fmt="png", dpi=100):
+    import matplotlib.pyplot as plt
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format=fmt, dpi=dpi, bbox_inches="tight")
+    # Release the artists right away rather than waiting for the garbage collector
+    fig.clf()
+    plt.close(fig)
+    return buffer.getvalue()
+
+
+class ChartRenderer:
+    # Renders figures to PNG/SVG bytes and caches them on (chart name, format, dpi, input data, parameters)
+    def __init__(self, cache=None, fmt="png", dpi=100):
+        self.cache = cache if cache is not None else ResultCache(max_entries=128, max_bytes=64 * 1024 * 1024)
+        self.fmt = fmt
+        self.dpi = dpi
+
+    def render(self, name, draw, *args, key=None, **params):
+        # key replaces hashing of args when the caller already has a cheaper version identifier for them
+        with stage(f"render.{name}"):
+            data_key = fingerprint(*args) if key is None else key
+            cache_key = ("chart", name, self.fmt, self.dpi, data_key, fingerprint(params))
+            return self.cache.get_or_compute(cache_key, lambda: figure_bytes(draw(*args, **params), self.fmt, self.dpi))
+
+
+def range_charts(analyzer):
+    review_score, _ = analyzer.review_score_df()
+    state, _ = analyzer.create_bystate_df()
+    return [
+        ("daily_orders", charts.daily_orders, analyzer.create_daily_orders_df()),
+        ("customer_spend", charts.customer_spend, analyzer.create_sum_spend_df()),
+        ("order_items", charts.order_items, analyzer.create_sum_order_items_df()),
+        ("review_scores", charts.review_scores, review_score),
+        ("customers_by_state", charts.customers_by_state, state),
+        ("delivery_lead_times", charts.delivery_lead_times, analyzer.create_delivery_daily_df()),
+    ]
+
+
+def history_charts(full_analyzer):
+    return [
+        ("price_vs_sell_probability", charts.price_vs_sell_probability, full_analyzer.create_product_hexbins()),
+        ("mean_transaction_by_state", charts.mean_transaction_by_state, full_analyzer.create_customer_regions_df()),
+    ]
+
+
+def export_charts(out_dir, periods=("all", "year", "quarter"), fmt="png", dpi=100, store_dir=None):
+    import matplotlib.pyplot as plt
+
+    import assets
+    import store
+    from cube import DailyCube
+    from delivery import DeliveryRollup
+    from density import DensityPyramid
+    from function import BrazilMapPlotter, DataAnalyzer
+    from schema import load_optimized
+    from timeindex import TimeIndex
+
+    store_dir = store_dir or store.STORE_DIR
+    store.ensure_store(store_dir=store_dir)
+    # The same persisted derived data as the dashboard, kept next to the store it covers
+    all_df, encoders = load_optimized(os.path.join(store_dir, "optimized"), store_dir=store_dir)
+    time_index = TimeIndex(all_df, "order_approved_at")
+    cube = DailyCube.refresh(os.path.join(store_dir, "cube"), store_dir)
+    delivery = DeliveryRollup.refresh(os.path.join(store_dir, "delivery"), store_dir, orders=time_index.slice)
+    geolocation = store.load_store(store.GEO_STORE, columns=["customer_unique_id", "geolocation_lat", "geolocation_lng"], store_dir=store_dir)
+    geolocation = geolocation.drop_duplicates(subset="customer_unique_id")
+
+    renderer = ChartRenderer(fmt=fmt, dpi=dpi)
+    written = []
+
+    def write(directory, name, image):
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{name}.{fmt}")
+        with open(path, "wb") as f:
+            f.write(image)
+        written.append(path)
+
+    for name, draw, data in history_charts(DataAnalyzer(all_df, encoders=encoders)):
+        write(out_dir, name, renderer.render(name, draw, data))
+    density = DensityPyramid(geolocation["geolocation_lng"].to_numpy(), geolocation["geolocation_lat"].to_numpy())
+    # A batch export can wait for the background download; the dashboard only prefetches it
+    assets.fetch_missing(["brazil_map"])
+    map_plot = BrazilMapPlotter(geolocation, plt, None, density=density)
+    write(out_dir, "customer_map", renderer.render("customer_map", map_plot.figure, key="export"))
+
+    for label, start_date, end_date in standard_ranges(time_index.min, time_index.max, periods):
+        lo, hi = time_index.bounds(start_date, end_date)
+        if lo == hi:
+            continue
+        analyzer = DataAnalyzer.from_time_index(time_index, start_date, end_date, cube=cube, delivery=delivery, encoders=encoders)
+        for name, draw, data in range_charts(analyzer):
+            write(os.path.join(out_dir, label), name, renderer.render(name, draw, data))
+
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-render every dashboard chart for a set of standard date ranges.")
+    parser.add_argument("--out", required=True, help="output directory")
+    parser.add_argument("--periods", nargs="+", default=["all", "year", "quarter"], choices=["all", "year", "quarter", "month"])
+    parser.add_argument("--format", default="png", choices=["png", "svg"])
+    parser.add_argument("--dpi", type=int, default=100)
+    args = parser.parse_args()
+
+    paths = export_charts(args.out, args.periods, args.format, args.dpi)
+    print(f"Wrote {len(paths)} charts to {args.out}")
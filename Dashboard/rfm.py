@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+
+N_BINS = 4
+
+# Segment -> R/F/M score strings, as in the original RFM analysis; anything else is "Others"
+SEGMENTS = {
+    "Best Customers": ["444", "344", "434", "443"],
+    "Loyal Customers": ["333", "433", "343", "334", "324"],
+    "Lost Customers": ["111", "211", "121", "112"],
+    "Potential Customers": ["122", "132", "213", "223"],
+}
+OTHER_SEGMENT = "Others"
+
+# How per-customer aggregates combine, both within a batch and across batches
+AGGREGATIONS = {"last_purchase": "max", "frequency": "sum", "monetary": "sum"}
+
+
+def quantile_scores(values, n_bins=N_BINS, ascending=True):
+    # Same right-closed quantile bins as pd.qcut, but tied edges just leave a bin empty instead of raising
+    values = np.asarray(values, dtype=np.float64)
+    if not len(values):
+        return np.empty(0, dtype=np.int8)
+    edges = np.quantile(values, np.linspace(0, 1, n_bins + 1)[1:-1])
+    bins = np.searchsorted(edges, values, side="left")
+    scores = bins + 1 if ascending else n_bins - bins
+    return scores.astype(np.int8)
+
+
+def segment_lookup(n_bins=N_BINS, segments=SEGMENTS, other=OTHER_SEGMENT):
+    # Score labels and segment codes for every (r, f, m) cell, indexed by (r-1)*n^2 + (f-1)*n + (m-1)
+    r, f, m = np.meshgrid(*[np.arange(1, n_bins + 1)] * 3, indexing="ij")
+    labels = np.char.add(np.char.add(r.ravel().astype(str), f.ravel().astype(str)), m.ravel().astype(str))
+    names = list(segments) + [other]
+    codes = np.full(len(labels), len(names) - 1, dtype=np.int8)
+    for code, name in enumerate(segments):
+        codes[np.isin(labels, segments[name])] = code
+    return labels, codes, names
+
+
+class RFMTable:
+    # Per-customer last purchase (int64 ns), order count and spend. Aggregates are additive, so new
+    # orders are folded in with update() without going back to the order history.
+    def __init__(self, aggregates, customer="customer_unique_id", n_bins=N_BINS):
+        self.aggregates = aggregates
+        self.customer = customer
+        self.n_bins = n_bins
+
+    @staticmethod
+    def aggregate(df, customer="customer_unique_id", timestamp="order_purchase_timestamp", order="order_id", value="payment_value"):
+        rows = df[df[customer].notna() & df[timestamp].notna()]
+        grouped = pd.DataFrame({
+            "last_purchase": rows[timestamp].to_numpy(dtype="datetime64[ns]").view(np.int64),
+            "frequency": rows[order].notna().to_numpy(dtype=np.int64),
+            "monetary": rows[value].to_numpy(dtype=np.float64),
+        }, index=pd.Index(rows[customer])).groupby(level=0, sort=False).agg(AGGREGATIONS)
+        grouped.index.name = customer
+        return grouped
+
+    @classmethod
+    def from_orders(cls, df, customer="customer_unique_id", n_bins=N_BINS, **columns):
+        return cls(cls.aggregate(df, customer, **columns), customer, n_bins)
+
+    def __len__(self):
+        return len(self.aggregates)
+
+    def update(self, df, **columns):
+        batch = self.aggregate(df, self.customer, **columns)
+        self.aggregates = pd.concat([self.aggregates, batch]).groupby(level=0, sort=False).agg(AGGREGATIONS)
+        self.aggregates.index.name = self.customer
+        return self
+
+    def scores(self, as_of=None):
+        last_purchase = self.aggregates["last_purchase"].to_numpy()
+        if as_of is None:
+            as_of = last_purchase.max() if len(last_purchase) else 0
+        else:
+            as_of = pd.Timestamp(as_of).value
+        recency = (as_of - last_purchase) // (24 * 3600 * 10 ** 9)
+
+        n = self.n_bins
+        r = quantile_scores(recency, n, ascending=False)
+        f = quantile_scores(self.aggregates["frequency"].to_numpy(), n)
+        m = quantile_scores(self.aggregates["monetary"].to_numpy(), n)
+        cell = (r.astype(np.int32) - 1) * n * n + (f.astype(np.int32) - 1) * n + (m.astype(np.int32) - 1)
+
+        labels, codes, names = segment_lookup(n)
+        return pd.DataFrame({
+            self.customer: self.aggregates.index,
+            "recency": recency,
+            "frequency": self.aggregates["frequency"].to_numpy(),
+            "monetary": self.aggregates["monetary"].to_numpy(),
+            "r_score": r,
+            "f_score": f,
+            "m_score": m,
+            "rfm_score": pd.Categorical.from_codes(cell, categories=labels),
+            "segment": pd.Categorical.from_codes(codes[cell], categories=names),
+        })
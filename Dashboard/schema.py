@@ -0,0 +1,162 @@
+import argparse
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+import store
+
+OPTIMIZED_DIR = os.path.join(store.STORE_DIR, "optimized")
+
+# 32-character hex identifiers replaced by integer surrogate keys
+ID_COLS = ["order_id", "customer_id", "customer_unique_id", "product_id", "seller_id", "review_id"]
+
+# Integer-valued columns that pandas reads as float64 or int64
+INTEGER_COLS = [
+    "review_score", "order_item_id", "payment_sequential", "payment_installments", "review_comment_message",
+    "product_photos_qty", "customer_zip_code_prefix", "seller_zip_code_prefix", "geolocation_zip_code_prefix",
+]
+
+KEY_DTYPE = "string[pyarrow]"
+
+
+class KeyEncoder:
+    # Reversible mapping from identifiers to dense int32 codes. New identifiers are appended, so codes
+    # stay stable when later batches of the same table are encoded with the same encoder.
+    def __init__(self, keys=None):
+        # Arrow-backed strings keep the lookup table at roughly the raw key size
+        self.keys = pd.Index([] if keys is None else keys, dtype=KEY_DTYPE)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def encode(self, values):
+        values = pd.Series(values, copy=False).astype(object)
+        codes = self.keys.get_indexer(values)
+        new = pd.unique(values[(codes == -1) & values.notna().to_numpy()])
+        if len(new):
+            self.keys = self.keys.append(pd.Index(new, dtype=KEY_DTYPE))
+            codes = self.keys.get_indexer(values)
+        return _masked_codes(codes)
+
+    def decode(self, codes):
+        codes = pd.array(codes, dtype="Int32")
+        mask = codes.isna()
+        positions = codes.to_numpy(dtype=np.int64, na_value=0)
+        values = self.keys.to_numpy(dtype=object)[positions] if len(self.keys) else np.full(len(codes), None, dtype=object)
+        values[mask] = None
+        return values
+
+
+def _masked_codes(codes):
+    missing = codes < 0
+    return pd.arrays.IntegerArray(np.where(missing, 0, codes).astype(np.int32), missing)
+
+
+def downcast_integer(series):
+    if series.isna().any():
+        # float32 holds every integer below 2**24 exactly and keeps NaN semantics for pandas and numpy
+        return series.astype(np.float32)
+    return pd.to_numeric(series.astype(np.int64), downcast="integer")
+
+
+def optimize_frame(df, encoders=None):
+    # Returns the compacted frame and the key encoders; pass the same encoders for every frame that shares keys
+    encoders = {} if encoders is None else encoders
+    columns = {}
+    for col in df.columns:
+        series = df[col]
+        if col in ID_COLS:
+            encoder = encoders.setdefault(col, KeyEncoder())
+            columns[col] = pd.Series(encoder.encode(series), index=df.index, name=col)
+        elif col in store.CATEGORY_COLS and not isinstance(series.dtype, pd.CategoricalDtype):
+            columns[col] = series.astype("category")
+        elif col in INTEGER_COLS and pd.api.types.is_numeric_dtype(series):
+            columns[col] = downcast_integer(series)
+        else:
+            columns[col] = series
+    return pd.DataFrame(columns, index=df.index), encoders
+
+
+def decode_frame(df, encoders):
+    # Decodes the ID columns and index levels that still hold surrogate codes
+    df = df.copy()
+    for col, encoder in encoders.items():
+        if col in df.columns and pd.api.types.is_integer_dtype(df[col].dtype):
+            df[col] = encoder.decode(df[col].array)
+    levels = [name for name in df.index.names if name in encoders]
+    if levels:
+        index = df.index.to_frame(index=False)
+        for name in levels:
+            if pd.api.types.is_integer_dtype(index[name].dtype):
+                index[name] = encoders[name].decode(index[name].array)
+        df.index = pd.MultiIndex.from_frame(index) if df.index.nlevels > 1 else pd.Index(index.iloc[:, 0], name=df.index.name)
+    return df
+
+
+def load_optimized(cache_dir=OPTIMIZED_DIR, name=store.MAIN_STORE, store_dir=store.STORE_DIR):
+    # optimize_frame over the whole store, kept on disk per store segment together with the keys each
+    # segment added to the encoders. A restart reads it back and only encodes the segments appended
+    # since; it is rebuilt when the store's base file was rewritten.
+    meta_path = os.path.join(cache_dir, "optimized.json")
+    try:
+        with open(meta_path) as f:
+            covered = json.load(f)["segments"]
+    except (OSError, ValueError, KeyError):
+        covered = []
+    pending = store.pending_segments(covered, name, store_dir)
+    if pending is None:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        covered, pending = [], store.segments(name, store_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    # Codes are positions in the encoder keys, so the keys are restored in the order they were added
+    keys = {}
+    for index in range(len(covered)):
+        for col, added in pd.read_parquet(os.path.join(cache_dir, f"keys-{index:05d}.parquet")).groupby("column", sort=False)["key"]:
+            keys.setdefault(col, []).append(added)
+    encoders = {col: KeyEncoder(pd.concat(added, ignore_index=True)) for col, added in keys.items()}
+
+    for segment in pending:
+        index = len(covered)
+        sizes = {col: len(encoder) for col, encoder in encoders.items()}
+        optimized, encoders = optimize_frame(store.load_segment(segment, store_dir=store_dir), encoders)
+        feather.write_feather(pa.Table.from_pandas(optimized, preserve_index=False), os.path.join(cache_dir, f"part-{index:05d}.feather"))
+        added = [pd.DataFrame({"column": col, "key": encoder.keys[sizes.get(col, 0):].to_numpy(dtype=object)}) for col, encoder in encoders.items()]
+        pd.concat(added, ignore_index=True).to_parquet(os.path.join(cache_dir, f"keys-{index:05d}.parquet"), index=False)
+        covered.append(segment)
+        with open(meta_path + ".tmp", "w") as f:
+            json.dump({"segments": covered}, f)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    tables = [feather.read_table(os.path.join(cache_dir, f"part-{index:05d}.feather"), memory_map=True) for index in range(len(covered))]
+    return store.concat_frame(tables), encoders
+
+
+def memory_report(before, after, encoders=None):
+    report = pd.DataFrame({
+        "dtype_before": before.dtypes.astype(str),
+        "bytes_before": before.memory_usage(index=False, deep=True),
+        "dtype_after": after.dtypes.astype(str),
+        "bytes_after": after.memory_usage(index=False, deep=True),
+    })
+    for col, encoder in (encoders or {}).items():
+        report.loc[f"{col} (lookup)"] = ["", 0, KEY_DTYPE, int(encoder.keys.memory_usage(deep=True))]
+    report.loc["total"] = ["", report["bytes_before"].sum(), "", report["bytes_after"].sum()]
+    report["ratio"] = (report["bytes_before"] / report["bytes_after"]).where(report["bytes_before"] > 0)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report per-column memory of the merged table before and after schema optimization.")
+    parser.add_argument("--store", default=store.STORE_DIR, help="directory with the feather store")
+    args = parser.parse_args()
+
+    all_df = store.load_store(store.MAIN_STORE, store_dir=args.store)
+    optimized, encoders = optimize_frame(all_df)
+    with pd.option_context("display.max_rows", None, "display.width", 200):
+        print(memory_report(all_df, optimized, encoders))
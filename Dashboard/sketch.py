@@ -0,0 +1,119 @@
+import numpy as np
+import pandas as pd
+
+DEFAULT_PRECISION = 14
+
+
+def hash_values(values):
+    # Works for object, numeric, nullable integer and categorical values alike
+    return pd.util.hash_pandas_object(pd.Series(values, copy=False), index=False).to_numpy()
+
+
+def _bit_length(x):
+    # Exact for values below 2**32, which is all we ever pass in
+    return np.where(x > 0, np.floor(np.log2(np.maximum(x, 1).astype(np.float64))).astype(np.int64) + 1, 0)
+
+
+def register_ranks(hashes, precision=DEFAULT_PRECISION):
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    width = 64 - precision
+    index = (hashes >> np.uint64(width)).astype(np.int64)
+    rest = hashes & np.uint64((1 << width) - 1)
+    high = (rest >> np.uint64(32)).astype(np.int64)
+    low = (rest & np.uint64(0xFFFFFFFF)).astype(np.int64)
+    bits = np.where(high > 0, _bit_length(high) + 32, _bit_length(low))
+    rank = (width - bits + 1).astype(np.uint8)
+    return index, rank
+
+
+def estimate(registers):
+    # HyperLogLog estimate with linear counting for small cardinalities, vectorized over leading axes
+    registers = np.asarray(registers)
+    m = registers.shape[-1]
+    alpha = 0.7213 / (1 + 1.079 / m)
+    raw = alpha * m * m / np.sum(np.exp2(-registers.astype(np.float64)), axis=-1)
+    zeros = np.sum(registers == 0, axis=-1)
+    linear = m * np.log(m / np.maximum(zeros, 1))
+    return np.where((raw <= 2.5 * m) & (zeros > 0), linear, raw)
+
+
+def relative_error(precision=DEFAULT_PRECISION):
+    return 1.04 / np.sqrt(1 << precision)
+
+
+def precision_for_error(error):
+    # Smallest precision whose standard error is within `error`, e.g. 0.01 -> 14 (0.81%)
+    return int(np.clip(np.ceil(2 * np.log2(1.04 / error)), 4, 18))
+
+
+class HyperLogLog:
+    def __init__(self, precision=DEFAULT_PRECISION, registers=None):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8) if registers is None else registers
+
+    @classmethod
+    def from_values(cls, values, precision=DEFAULT_PRECISION):
+        sketch = cls(precision)
+        sketch.update(values)
+        return sketch
+
+    def update(self, values):
+        values = pd.Series(values, copy=False)
+        index, rank = register_ranks(hash_values(values[values.notna()]), self.precision)
+        np.maximum.at(self.registers, index, rank)
+        return self
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge sketches with different precision")
+        return HyperLogLog(self.precision, np.maximum(self.registers, other.registers))
+
+    def count(self):
+        return float(estimate(self.registers))
+
+
+def sparse_registers(groups, values, precision=DEFAULT_PRECISION):
+    # One row per (group..., register) with the highest rank seen, i.e. a sparse sketch per group
+    present = pd.Series(values, copy=False).notna().to_numpy()
+    index, rank = register_ranks(hash_values(values[present]), precision)
+    frame = groups[present].reset_index(drop=True).assign(register=index.astype(np.int32), rank=rank)
+    keys = list(groups.columns) + ["register"]
+    return frame.groupby(keys, observed=True, sort=True)["rank"].max().reset_index()
+
+
+def merge_registers(group_codes, register, rank, n_groups, precision=DEFAULT_PRECISION):
+    # Densify and merge sparse register rows into one sketch per group code
+    registers = np.zeros((n_groups, 1 << precision), dtype=np.uint8)
+    np.maximum.at(registers, (np.asarray(group_codes), np.asarray(register)), np.asarray(rank, dtype=np.uint8))
+    return registers
+
+
+def grouped_distinct(df, by, value, precision=DEFAULT_PRECISION):
+    # Approximate df.groupby(by)[value].nunique(), one sketch per group
+    by = [by] if isinstance(by, str) else list(by)
+    rows = sparse_registers(df[by], df[value], precision)
+    grouper = rows.groupby(by, observed=True, sort=True)
+    labels = grouper.size().index
+    registers = merge_registers(grouper.ngroup().to_numpy(), rows["register"].to_numpy(), rows["rank"].to_numpy(), len(labels), precision)
+    return pd.Series(np.rint(estimate(registers)).astype(np.int64), index=labels, name=value)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    import store
+
+    parser = argparse.ArgumentParser(description="Compare sketch estimates with exact distinct counts on the local store.")
+    parser.add_argument("--error", type=float, default=0.01, help="target relative standard error")
+    args = parser.parse_args()
+
+    precision = precision_for_error(args.error)
+    df = store.load_store(store.MAIN_STORE, columns=["order_approved_at", "order_id", "customer_id", "customer_state"])
+    df["day"] = df["order_approved_at"].dt.normalize()
+    print(f"precision {precision}, standard error {relative_error(precision):.4f}")
+    for by, value in (("customer_state", "customer_id"), ("day", "order_id")):
+        exact = df.groupby(by, observed=True)[value].nunique()
+        approx = grouped_distinct(df, by, value, precision).reindex(exact.index)
+        error = np.abs(approx - exact) / exact
+        print(f"{value} by {by}: {len(exact)} groups, max error {error.max():.4f}, "
+              f"{(error <= 3 * relative_error(precision)).mean():.1%} within 3 standard errors")
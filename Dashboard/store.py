@@ -0,0 +1,319 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from perf import timed
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATASET_DIR = os.path.join(BASE_DIR, "..", "Dataset")
+STORE_DIR = os.path.join(BASE_DIR, "data")
+
+MAIN_STORE = "olist_ecommerce_data"
+GEO_STORE = "olist_ecommerce_data_silver"
+
+# Published copies of the merged tables, only used when the raw Olist CSVs are not available locally
+REMOTE_URL = "https://raw.githubusercontent.com/AndikaBN/subm_analisis_data_with_py/refs/heads/main/Dashboard/"
+
+RAW_FILES = {
+    "orders": "orders_dataset.csv",
+    "items": "order_items_dataset.csv",
+    "products": "products_dataset.csv",
+    "payments": "order_payments_dataset.csv",
+    "reviews": "order_reviews_dataset.csv",
+    "customers": "customers_dataset.csv",
+    "sellers": "sellers_dataset.csv",
+    "geo": "geolocation_dataset.csv",
+    "category": "product_category_name_translation.csv",
+}
+
+RAW_DATETIME_COLS = {
+    "orders": ["order_purchase_timestamp", "order_approved_at", "order_delivered_carrier_date", "order_delivered_customer_date", "order_estimated_delivery_date"],
+    "items": ["shipping_limit_date"],
+    "reviews": ["review_creation_date", "review_answer_timestamp"],
+}
+
+DATETIME_COLS = [col for cols in RAW_DATETIME_COLS.values() for col in cols]
+
+CATEGORY_COLS = [
+    "order_status", "delivered_on_time", "payment_type",
+    "customer_city", "customer_state", "seller_city", "seller_state",
+    "product_category_name", "product_category_name_english",
+    "geolocation_city", "geolocation_state",
+]
+
+STRING_COLS = ["customer_id", "customer_unique_id", "order_id", "review_id", "product_id", "seller_id"]
+INT_COLS = ["customer_zip_code_prefix", "geolocation_zip_code_prefix"]
+
+CUSTOMER_ORDER_COLUMNS = [
+    "customer_id", "customer_unique_id", "customer_zip_code_prefix", "customer_city", "customer_state",
+    "order_id", "order_status", "order_purchase_timestamp", "order_approved_at", "order_delivered_carrier_date",
+    "order_delivered_customer_date", "order_estimated_delivery_date", "delivered_on_time",
+    "payment_sequential", "payment_type", "payment_installments", "payment_value",
+    "review_id", "review_score", "review_comment_message", "review_creation_date", "review_answer_timestamp",
+]
+MAIN_COLUMNS = CUSTOMER_ORDER_COLUMNS + [
+    "product_id", "product_category_name", "product_photos_qty", "product_category_name_english",
+    "order_item_id", "seller_id", "shipping_limit_date", "price", "freight_value",
+    "seller_zip_code_prefix", "seller_city", "seller_state",
+]
+GEO_COLUMNS = CUSTOMER_ORDER_COLUMNS + [
+    "geolocation_zip_code_prefix", "geolocation_city", "geolocation_state", "geolocation_lat", "geolocation_lng",
+]
+
+
+def arrow_schema(columns):
+    fields = []
+    for col in columns:
+        if col in DATETIME_COLS:
+            fields.append(pa.field(col, pa.timestamp("ns")))
+        elif col in CATEGORY_COLS:
+            fields.append(pa.field(col, pa.dictionary(pa.int32(), pa.string())))
+        elif col in STRING_COLS:
+            fields.append(pa.field(col, pa.string()))
+        elif col in INT_COLS:
+            fields.append(pa.field(col, pa.int64()))
+        else:
+            fields.append(pa.field(col, pa.float64()))
+    return pa.schema(fields)
+
+
+def read_raw(dataset_dir=DATASET_DIR):
+    data = {}
+    for key, filename in RAW_FILES.items():
+        data[key] = pd.read_csv(os.path.join(dataset_dir, filename), parse_dates=RAW_DATETIME_COLS.get(key, []))
+    return data
+
+
+def undelivered_order_ids(orders):
+    return orders.loc[(orders["order_status"] != "delivered") | orders["order_delivered_customer_date"].isna(), "order_id"]
+
+
+def clean_orders(orders):
+    orders = orders.copy()
+    orders["delivered_on_time"] = np.where(orders["order_delivered_customer_date"] < orders["order_estimated_delivery_date"], "On Time", "Late")
+    return orders
+
+
+def clean_reviews(reviews):
+    reviews = reviews.drop(columns=["review_comment_title"])
+    reviews["review_comment_message"] = np.where(reviews["review_comment_message"].isnull(), 0, 1)
+    return reviews
+
+
+def clean_products(products):
+    products = products.drop(columns=["product_name_lenght", "product_description_lenght", "product_weight_g", "product_length_cm", "product_height_cm", "product_width_cm"])
+    products["product_category_name"] = products["product_category_name"].fillna(value="outro")
+    products["product_photos_qty"] = products["product_photos_qty"].fillna(value=0)
+    return products
+
+
+def build_geolocation_silver(geo):
+    geo = geo.drop_duplicates()
+    max_state = geo.groupby(["geolocation_zip_code_prefix", "geolocation_state"]).size().reset_index(name="count")
+    max_state = max_state.drop_duplicates(subset="geolocation_zip_code_prefix").drop("count", axis=1)
+    geolocation_silver = geo.groupby(["geolocation_zip_code_prefix", "geolocation_city", "geolocation_state"])[["geolocation_lat", "geolocation_lng"]].median().reset_index()
+    return geolocation_silver.merge(max_state, on=["geolocation_zip_code_prefix", "geolocation_state"], how="inner")
+
+
+def merge_tables(customers, orders, payments, reviews, items, sellers, product_df, geolocation_silver):
+    # orders and reviews must already be cleaned; product_df is the cleaned products joined with the category translation
+    customers_orders_df = customers.merge(orders, how="left", on="customer_id")
+    payments_reviews_df = payments.merge(reviews, how="left", on="order_id")
+    customers_df = customers_orders_df.merge(payments_reviews_df, how="left", on="order_id")
+
+    item_seller_df = items.merge(sellers, how="left", on="seller_id")
+    sellers_df = product_df.merge(item_seller_df, how="left", on="product_id")
+
+    # Products that were never sold carry no order_id and would only fan out the unmatched customer rows
+    sellers_df = sellers_df[sellers_df["order_id"].notna()]
+    all_df = customers_df.merge(sellers_df, how="left", on="order_id").drop_duplicates("order_id")
+
+    silver_df = customers_df.merge(geolocation_silver, left_on="customer_zip_code_prefix", right_on="geolocation_zip_code_prefix", how="inner")
+    silver_df = silver_df.drop_duplicates("order_id")
+
+    return all_df, silver_df
+
+
+def wrangle(data):
+    # Same cleaning and merge chain as notebook.ipynb, producing the main and silver (geolocation) tables
+    undelivered = undelivered_order_ids(data["orders"])
+    for key, value in data.items():
+        if "order_id" in value.columns:
+            data[key] = value[~value["order_id"].isin(undelivered)]
+
+    product_df = clean_products(data["products"]).merge(data["category"], how="left", on="product_category_name")
+    return merge_tables(
+        data["customers"], clean_orders(data["orders"]), data["payments"], clean_reviews(data["reviews"]),
+        data["items"], data["sellers"], product_df, build_geolocation_silver(data["geo"]),
+    )
+
+
+@timed("store.parse_dtypes")
+def apply_dtypes(df):
+    df = df.copy()
+    for col in DATETIME_COLS:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col])
+    for col in CATEGORY_COLS:
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+    if "order_approved_at" in df.columns:
+        df = df.sort_values(by="order_approved_at", kind="stable")
+    return df.reset_index(drop=True)
+
+
+def store_path(name, store_dir=STORE_DIR):
+    return os.path.join(store_dir, name + ".feather")
+
+
+def delta_paths(name, store_dir=STORE_DIR):
+    # Batches appended with append_store since the base file was last compacted, oldest first
+    prefix = name + ".delta-"
+    if not os.path.isdir(store_dir):
+        return []
+    return [os.path.join(store_dir, f) for f in sorted(os.listdir(store_dir)) if f.startswith(prefix) and f.endswith(".feather")]
+
+
+def segment_paths(name, store_dir=STORE_DIR):
+    return [store_path(name, store_dir)] + delta_paths(name, store_dir)
+
+
+def _write_feather(df, path, compression):
+    # Categoricals are written as Arrow dictionary arrays
+    table = pa.Table.from_pandas(apply_dtypes(df), preserve_index=False)
+    feather.write_feather(table, path + ".tmp", compression=compression)
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def write_store(df, name, store_dir=STORE_DIR, compression="lz4"):
+    # Replaces the base file only; rows appended since stay in their delta files
+    os.makedirs(store_dir, exist_ok=True)
+    return _write_feather(df, store_path(name, store_dir), compression)
+
+
+def append_store(df, name, store_dir=STORE_DIR, compression="lz4"):
+    # New rows go to the next delta file instead of rewriting the base; load_store reads them after it
+    os.makedirs(store_dir, exist_ok=True)
+    number = len(delta_paths(name, store_dir)) + 1
+    return _write_feather(df, os.path.join(store_dir, f"{name}.delta-{number:05d}.feather"), compression)
+
+
+def compact_store(name, store_dir=STORE_DIR, compression="lz4"):
+    # The base file and its deltas are read back as one frame, which becomes the new base file
+    path = write_store(load_store(name, store_dir=store_dir), name, store_dir, compression)
+    for delta in delta_paths(name, store_dir):
+        os.remove(delta)
+    return path
+
+
+@timed("store.build")
+def build_store(dataset_dir=DATASET_DIR, store_dir=STORE_DIR, compression="lz4"):
+    all_df, silver_df = wrangle(read_raw(dataset_dir))
+    write_store(all_df, MAIN_STORE, store_dir, compression)
+    write_store(silver_df, GEO_STORE, store_dir, compression)
+
+
+@timed("store.download")
+def convert_remote(store_dir=STORE_DIR, compression="lz4"):
+    for name in (MAIN_STORE, GEO_STORE):
+        write_store(pd.read_csv(REMOTE_URL + name + ".csv"), name, store_dir, compression)
+
+
+def ensure_store(dataset_dir=DATASET_DIR, store_dir=STORE_DIR):
+    if all(os.path.exists(store_path(name, store_dir)) for name in (MAIN_STORE, GEO_STORE)):
+        return
+    if all(os.path.exists(os.path.join(dataset_dir, filename)) for filename in RAW_FILES.values()):
+        build_store(dataset_dir, store_dir)
+    else:
+        convert_remote(store_dir)
+
+
+def concat_tables(tables):
+    # Files written separately can differ in dictionary index width, or in type where one is all null
+    if len(tables) == 1:
+        return tables[0]
+    schema = pa.unify_schemas([table.schema for table in tables], promote_options="permissive")
+    return pa.concat_tables([table.select(schema.names).cast(schema) for table in tables])
+
+
+def concat_frame(tables):
+    # Each file is sorted on its own; the frame as a whole must be too (see TimeIndex)
+    df = concat_tables(tables).to_pandas(split_blocks=True, self_destruct=True)
+    if len(tables) > 1 and "order_approved_at" in df.columns:
+        df = df.sort_values("order_approved_at", kind="stable", ignore_index=True)
+    return df
+
+
+def read_table(name, columns=None, store_dir=STORE_DIR):
+    return concat_tables([feather.read_table(path, columns=columns, memory_map=True) for path in segment_paths(name, store_dir)])
+
+
+@timed("store.load")
+def load_store(name, columns=None, store_dir=STORE_DIR):
+    return concat_frame([feather.read_table(path, columns=columns, memory_map=True) for path in segment_paths(name, store_dir)])
+
+
+def file_version(path):
+    stat = os.stat(path)
+    return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+
+def store_version(name, store_dir=STORE_DIR):
+    # Changes with every write of the base file and every appended delta
+    version = file_version(store_path(name, store_dir))
+    deltas = delta_paths(name, store_dir)
+    return f"{version}+{len(deltas)}-{file_version(deltas[-1])}" if deltas else version
+
+
+def segments(name, store_dir=STORE_DIR):
+    # The base file and each delta as "<file>@<version>"; data derived from the store records the
+    # segments it covers, so it only has to fold in the ones appended since
+    return [f"{os.path.basename(path)}@{file_version(path)}" for path in segment_paths(name, store_dir)]
+
+
+def load_segment(segment, columns=None, store_dir=STORE_DIR):
+    table = feather.read_table(os.path.join(store_dir, segment.split("@")[0]), columns=columns, memory_map=True)
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def pending_segments(covered, name=MAIN_STORE, store_dir=STORE_DIR):
+    # Segments appended after `covered`, or None when `covered` is empty or no longer a prefix of the
+    # store's segments (the base file was rewritten), i.e. when derived data has to be rebuilt
+    current = segments(name, store_dir)
+    if not covered or current[:len(covered)] != list(covered):
+        return None
+    return current[len(covered):]
+
+
+def fold_segments(derived, build, columns=None, merge=None, name=MAIN_STORE, store_dir=STORE_DIR):
+    # Brings derived data (anything with a segments list) up to date with the store: build(frame) runs on
+    # each segment it does not cover yet and merge(derived, part) folds the result in, so the work is
+    # proportional to what was appended. Returns (derived, changed).
+    merge = merge or (lambda derived, part: derived.merge(part))
+    pending = pending_segments(derived.segments if derived is not None else None, name, store_dir)
+    if pending is None:
+        derived, pending = None, segments(name, store_dir)
+    for segment in pending:
+        part = build(load_segment(segment, columns, store_dir))
+        part.segments = [segment]
+        derived = part if derived is None else merge(derived, part)
+    return derived, bool(pending)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the local Olist columnar store used by the dashboard.")
+    parser.add_argument("--dataset", default=DATASET_DIR, help="directory with the raw Olist CSV files")
+    parser.add_argument("--out", default=STORE_DIR, help="output directory for the feather files")
+    parser.add_argument("--compression", default="lz4", choices=["lz4", "zstd", "uncompressed"])
+    parser.add_argument("--remote", action="store_true", help="convert the published merged CSVs instead of the raw dataset")
+    args = parser.parse_args()
+
+    if args.remote:
+        convert_remote(args.out, args.compression)
+    else:
+        build_store(args.dataset, args.out, args.compression)
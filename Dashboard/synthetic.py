@@ -0,0 +1,297 @@
+import argparse
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+import store
+
+# Share of customers per state, roughly as in the public Olist data
+STATE_WEIGHTS = {
+    "SP": .420, "RJ": .129, "MG": .117, "RS": .055, "PR": .051, "SC": .037, "BA": .034, "DF": .022,
+    "ES": .020, "GO": .020, "PE": .017, "CE": .013, "PA": .010, "MT": .009, "MA": .008, "MS": .007,
+    "PB": .005, "PI": .005, "RN": .005, "AL": .004, "SE": .003, "TO": .003, "RO": .003, "AM": .002,
+    "AC": .001, "AP": .001, "RR": .001,
+}
+# Approximate (lat, lng) of each state's main population centre
+STATE_CENTRES = {
+    "SP": (-23.5, -46.6), "RJ": (-22.9, -43.2), "MG": (-19.9, -43.9), "RS": (-30.0, -51.2), "PR": (-25.4, -49.3),
+    "SC": (-27.6, -48.5), "BA": (-12.9, -38.5), "DF": (-15.8, -47.9), "ES": (-20.3, -40.3), "GO": (-16.7, -49.3),
+    "PE": (-8.1, -34.9), "CE": (-3.7, -38.5), "PA": (-1.5, -48.5), "MT": (-15.6, -56.1), "MA": (-2.5, -44.3),
+    "MS": (-20.5, -54.6), "PB": (-7.1, -34.9), "PI": (-5.1, -42.8), "RN": (-5.8, -35.2), "AL": (-9.7, -35.7),
+    "SE": (-10.9, -37.1), "TO": (-10.2, -48.3), "RO": (-8.8, -63.9), "AM": (-3.1, -60.0), "AC": (-10.0, -67.8),
+    "AP": (0.0, -51.1), "RR": (2.8, -60.7),
+}
+# Each state's capital is its largest city; the rest get generic names
+STATE_CAPITALS = {
+    "SP": "sao paulo", "RJ": "rio de janeiro", "MG": "belo horizonte", "RS": "porto alegre", "PR": "curitiba",
+    "SC": "florianopolis", "BA": "salvador", "DF": "brasilia", "ES": "vitoria", "GO": "goiania", "PE": "recife",
+    "CE": "fortaleza", "PA": "belem", "MT": "cuiaba", "MA": "sao luis", "MS": "campo grande", "PB": "joao pessoa",
+    "PI": "teresina", "RN": "natal", "AL": "maceio", "SE": "aracaju", "TO": "palmas", "RO": "porto velho",
+    "AM": "manaus", "AC": "rio branco", "AP": "macapa", "RR": "boa vista",
+}
+CITIES_PER_STATE = 40
+ORDER_STATUS = {"delivered": .970, "shipped": .011, "canceled": .006, "unavailable": .006, "invoiced": .003, "processing": .003, "approved": .001}
+PAYMENT_TYPES = {"credit_card": .74, "boleto": .19, "voucher": .055, "debit_card": .015}
+REVIEW_SCORES = {5: .58, 4: .19, 3: .08, 2: .03, 1: .12}
+ITEM_COUNTS = {1: .90, 2: .076, 3: .014, 4: .006, 5: .004}
+
+START = pd.Timestamp("2016-09-04")
+END = pd.Timestamp("2018-09-03")
+REPEAT_RATE = 0.03
+CHUNK_ORDERS = 1_000_000
+
+_HEX = np.array([f"{i:02x}".encode() for i in range(256)]).view(np.uint16)
+
+
+def _mix(x):
+    # splitmix64 finalizer: a cheap, well-spread hash of integer ids
+    x = np.asarray(x, dtype=np.uint64).copy()
+    x ^= x >> np.uint64(30)
+    x *= np.uint64(0xBF58476D1CE4E5B9)
+    x ^= x >> np.uint64(27)
+    x *= np.uint64(0x94D049BB133111EB)
+    x ^= x >> np.uint64(31)
+    return x
+
+
+def _kind_seed(kind):
+    # Stable across processes, unlike hash()
+    return sum(ord(c) * 31 ** i for i, c in enumerate(kind)) & 0xFFFFFFFF
+
+
+def make_ids(kind, numbers, seed=0):
+    # Deterministic 32-character hex ids, like the Olist md5 keys; the same (kind, number, seed) always gives the same id
+    salt = _mix([_kind_seed(kind) ^ (seed * 0x9E3779B9 & 0xFFFFFFFF)])[0]
+    numbers = np.asarray(numbers, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        first = _mix(numbers ^ salt)
+        words = np.stack([first, _mix(first ^ np.uint64(0x9E3779B97F4A7C15))], axis=1)
+    text = _HEX[words.view(np.uint8)].view("S32").ravel()
+    return text.astype(str)
+
+
+def _choice(rng, weights, size):
+    keys = np.array(list(weights))
+    p = np.array(list(weights.values()), dtype=np.float64)
+    return keys[rng.choice(len(keys), size, p=p / p.sum())]
+
+
+def _zipf_weights(n, exponent=1.1):
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+
+class SyntheticOlist:
+    # Schema-faithful raw Olist tables at any scale. Orders are generated in fixed-size chunks from
+    # per-chunk seeds, so a given (n_orders, seed) always produces the same files and memory stays flat.
+    def __init__(self, n_orders, seed=0, products=None, sellers=None, n_zips=None):
+        self.n_orders = n_orders
+        self.seed = seed
+        rng = np.random.default_rng([seed, 0])
+
+        self.states = np.array(list(STATE_WEIGHTS))
+        state_p = np.array(list(STATE_WEIGHTS.values()))
+        self.state_p = state_p / state_p.sum()
+
+        # Zip prefixes, each owned by one state, with roughly as many per state as customers
+        n_zips = n_zips or int(np.clip(n_orders // 5, 100, 19_000))
+        self.zip_state = rng.choice(len(self.states), n_zips, p=self.state_p)
+        self.zip_codes = np.sort(rng.choice(np.arange(1000, 99_999), n_zips, replace=False))
+        self.zip_city = self._zip_cities(np.random.default_rng([seed, 3]))
+
+        self.products = products if products is not None else self._products(rng, max(100, min(n_orders // 3, 33_000)))
+        self.sellers = sellers if sellers is not None else self._sellers(rng, max(20, min(n_orders // 30, 3_100)))
+        # Product popularity and seller size both follow a power law; each product has one main seller
+        self.product_p = _zipf_weights(len(self.products), 0.6)
+        self.product_seller = rng.choice(len(self.sellers), len(self.products), p=_zipf_weights(len(self.sellers), 0.9))
+        self.product_price = np.round(rng.lognormal(4.2, 0.9, len(self.products)), 2)
+        self.product_freight = np.round(rng.lognormal(2.8, 0.5, len(self.products)), 2)
+
+        # Order volume grows over the period
+        days = (END - START).days
+        ramp = np.linspace(0.2, 1.0, days)
+        self.day_p = ramp / ramp.sum()
+
+    @classmethod
+    def from_dataset(cls, n_orders, seed=0, dataset_dir=store.DATASET_DIR):
+        # Reuse the real products and sellers when they are available
+        products_path = os.path.join(dataset_dir, store.RAW_FILES["products"])
+        sellers_path = os.path.join(dataset_dir, store.RAW_FILES["sellers"])
+        if os.path.exists(products_path) and os.path.exists(sellers_path):
+            return cls(n_orders, seed, pd.read_csv(products_path), pd.read_csv(sellers_path))
+        return cls(n_orders, seed)
+
+    def _products(self, rng, n):
+        categories = ["cama_mesa_banho", "beleza_saude", "esporte_lazer", "moveis_decoracao", "informatica_acessorios",
+                      "utilidades_domesticas", "relogios_presentes", "telefonia", "brinquedos", "automotivo"]
+        return pd.DataFrame({
+            "product_id": make_ids("product", np.arange(n), self.seed),
+            "product_category_name": np.array(categories)[rng.choice(len(categories), n, p=_zipf_weights(len(categories), 0.8))],
+            "product_name_lenght": rng.integers(5, 76, n),
+            "product_description_lenght": rng.integers(4, 3993, n),
+            "product_photos_qty": rng.integers(1, 8, n),
+            "product_weight_g": rng.integers(50, 30_000, n),
+            "product_length_cm": rng.integers(7, 105, n),
+            "product_height_cm": rng.integers(2, 105, n),
+            "product_width_cm": rng.integers(6, 118, n),
+        })
+
+    def _zip_cities(self, rng):
+        # Every zip prefix lies in one city of its state; city sizes follow a power law, capital first
+        rank = rng.choice(CITIES_PER_STATE, len(self.zip_codes), p=_zipf_weights(CITIES_PER_STATE, 1.3))
+        names = [STATE_CAPITALS[state] if r == 0 else f"cidade {state.lower()} {r}" for state, r in zip(self.states[self.zip_state], rank)]
+        return np.array(names, dtype=object)
+
+    def _sellers(self, rng, n):
+        zips = rng.choice(len(self.zip_codes), n)
+        return pd.DataFrame({
+            "seller_id": make_ids("seller", np.arange(n), self.seed),
+            "seller_zip_code_prefix": self.zip_codes[zips],
+            "seller_city": self.zip_city[zips],
+            "seller_state": self.states[self.zip_state[zips]],
+        })
+
+    def geolocation(self):
+        rng = np.random.default_rng([self.seed, 1])
+        # A handful of coordinates per zip prefix, scattered around the owning state's centre
+        per_zip = rng.integers(1, 8, len(self.zip_codes))
+        zips = np.repeat(np.arange(len(self.zip_codes)), per_zip)
+        centres = np.array([STATE_CENTRES[state] for state in self.states])[self.zip_state[zips]]
+        return pd.DataFrame({
+            "geolocation_zip_code_prefix": self.zip_codes[zips],
+            "geolocation_lat": centres[:, 0] + rng.normal(0, 1.0, len(zips)),
+            "geolocation_lng": centres[:, 1] + rng.normal(0, 1.0, len(zips)),
+            "geolocation_city": self.zip_city[zips],
+            "geolocation_state": self.states[self.zip_state[zips]],
+        })
+
+    def _customer_zips(self, unique_numbers):
+        # A returning customer keeps the same zip prefix (and so state) across orders
+        h = _mix(np.asarray(unique_numbers, dtype=np.uint64) + np.uint64(_kind_seed("zip") ^ self.seed))
+        state = np.searchsorted(np.cumsum(self.state_p), (h >> np.uint64(11)).astype(np.float64) / float(1 << 53), side="right")
+        state = np.minimum(state, len(self.states) - 1)
+        zip_order = np.argsort(self.zip_state, kind="stable")
+        starts = np.searchsorted(self.zip_state[zip_order], state, side="left")
+        counts = np.searchsorted(self.zip_state[zip_order], state, side="right") - starts
+        # States that own no zip prefix fall back to any prefix
+        counts = np.where(counts > 0, counts, len(self.zip_codes))
+        starts = np.where(counts == len(self.zip_codes), 0, starts)
+        pick = zip_order[starts + (h % counts.astype(np.uint64)).astype(np.int64)]
+        return self.zip_codes[pick], self.zip_city[pick], self.states[self.zip_state[pick]]
+
+    def chunk(self, index):
+        # All fact tables for orders [index * CHUNK_ORDERS, ...) as raw Olist frames
+        lo = index * CHUNK_ORDERS
+        n = min(CHUNK_ORDERS, self.n_orders - lo)
+        rng = np.random.default_rng([self.seed, 2, index])
+        numbers = np.arange(lo, lo + n)
+
+        # Most customers order once; repeat orders go to an earlier customer, skewed towards the oldest ones
+        unique_numbers = np.where(rng.random(n) < REPEAT_RATE, (numbers * rng.power(0.3, n)).astype(np.int64), numbers)
+        zip_codes, cities, states = self._customer_zips(unique_numbers)
+        customer_ids = make_ids("customer", numbers, self.seed)
+        order_ids = make_ids("order", numbers, self.seed)
+        customers = pd.DataFrame({
+            "customer_id": customer_ids,
+            "customer_unique_id": make_ids("customer_unique", unique_numbers, self.seed),
+            "customer_zip_code_prefix": zip_codes,
+            "customer_city": cities,
+            "customer_state": states,
+        })
+
+        purchase = START + pd.to_timedelta(rng.choice(len(self.day_p), n, p=self.day_p), unit="D") + pd.to_timedelta(rng.integers(0, 86_400, n), unit="s")
+        approved = purchase + pd.to_timedelta(rng.exponential(6 * 3600, n).astype(np.int64), unit="s")
+        carrier = (approved + pd.to_timedelta(rng.gamma(2.0, 1.5, n) * 86_400, unit="s")).floor("s")
+        delivered = (carrier + pd.to_timedelta(rng.gamma(3.0, 3.0, n) * 86_400, unit="s")).floor("s")
+        estimated = (purchase + pd.to_timedelta(rng.integers(10, 40, n), unit="D")).normalize()
+        status = _choice(rng, ORDER_STATUS, n)
+        undelivered = status != "delivered"
+        orders = pd.DataFrame({
+            "order_id": order_ids,
+            "customer_id": customer_ids,
+            "order_status": status,
+            "order_purchase_timestamp": purchase,
+            "order_approved_at": approved.where(~np.isin(status, ["canceled", "unavailable"]) | (rng.random(n) < .5)),
+            "order_delivered_carrier_date": carrier.where(~undelivered | (status == "shipped")),
+            "order_delivered_customer_date": delivered.where(~undelivered),
+            "order_estimated_delivery_date": estimated,
+        })
+
+        n_items = _choice(rng, ITEM_COUNTS, n).astype(np.int64)
+        item_order = np.repeat(np.arange(n), n_items)
+        product = rng.choice(len(self.products), len(item_order), p=self.product_p)
+        items = pd.DataFrame({
+            "order_id": order_ids[item_order],
+            "order_item_id": np.arange(len(item_order)) - np.repeat(np.cumsum(n_items) - n_items, n_items) + 1,
+            "product_id": self.products["product_id"].to_numpy()[product],
+            "seller_id": self.sellers["seller_id"].to_numpy()[self.product_seller[product]],
+            "shipping_limit_date": approved.to_numpy()[item_order] + np.timedelta64(6, "D"),
+            "price": self.product_price[product],
+            "freight_value": self.product_freight[product],
+        })
+
+        order_value = np.bincount(item_order, weights=items["price"].to_numpy() + items["freight_value"].to_numpy(), minlength=n)
+        split = rng.random(n) < 0.03
+        n_payments = np.where(split, 2, 1)
+        payment_order = np.repeat(np.arange(n), n_payments)
+        sequential = np.arange(len(payment_order)) - np.repeat(np.cumsum(n_payments) - n_payments, n_payments) + 1
+        share = np.where(np.repeat(split, n_payments), np.where(sequential == 1, 0.3, 0.7), 1.0)
+        payment_type = _choice(rng, PAYMENT_TYPES, len(payment_order))
+        payments = pd.DataFrame({
+            "order_id": order_ids[payment_order],
+            "payment_sequential": sequential,
+            "payment_type": np.where(sequential == 1, payment_type, "voucher"),
+            "payment_installments": np.where(payment_type == "credit_card", rng.integers(1, 11, len(payment_order)), 1),
+            "payment_value": np.round(order_value[payment_order] * share, 2),
+        })
+
+        has_message = rng.random(n) < 0.41
+        created = (delivered.where(~undelivered, estimated) + pd.Timedelta(days=1)).normalize()
+        reviews = pd.DataFrame({
+            "review_id": make_ids("review", numbers, self.seed),
+            "order_id": order_ids,
+            "review_score": _choice(rng, REVIEW_SCORES, n),
+            "review_comment_title": np.where(rng.random(n) < 0.12, "recomendo", None),
+            "review_comment_message": np.where(has_message, "produto entregue no prazo", None),
+            "review_creation_date": created,
+            "review_answer_timestamp": created + pd.to_timedelta(rng.exponential(2 * 86_400, n).astype(np.int64), unit="s"),
+        })
+
+        return {"customers": customers, "orders": orders, "items": items, "payments": payments, "reviews": reviews}
+
+    def write(self, out_dir, dataset_dir=store.DATASET_DIR):
+        os.makedirs(out_dir, exist_ok=True)
+        n_chunks = max(1, -(-self.n_orders // CHUNK_ORDERS))
+        for index in range(n_chunks):
+            for key, frame in self.chunk(index).items():
+                frame.to_csv(os.path.join(out_dir, store.RAW_FILES[key]), mode="w" if index == 0 else "a", header=index == 0, index=False)
+
+        self.geolocation().to_csv(os.path.join(out_dir, store.RAW_FILES["geo"]), index=False)
+        self.products.to_csv(os.path.join(out_dir, store.RAW_FILES["products"]), index=False)
+        self.sellers.to_csv(os.path.join(out_dir, store.RAW_FILES["sellers"]), index=False)
+        category_path = os.path.join(dataset_dir, store.RAW_FILES["category"])
+        if os.path.exists(category_path):
+            shutil.copy(category_path, os.path.join(out_dir, store.RAW_FILES["category"]))
+        else:
+            names = self.products["product_category_name"].dropna().unique()
+            pd.DataFrame({"product_category_name": names, "product_category_name_english": names}).to_csv(
+                os.path.join(out_dir, store.RAW_FILES["category"]), index=False)
+        return out_dir
+
+
+def generate(out_dir, n_orders, seed=0, dataset_dir=store.DATASET_DIR):
+    return SyntheticOlist.from_dataset(n_orders, seed, dataset_dir).write(out_dir, dataset_dir)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic raw Olist CSVs with realistic skew at any scale.")
+    parser.add_argument("--out", required=True, help="output directory for the raw CSV files")
+    parser.add_argument("--orders", type=int, default=100_000, help="number of orders (items, payments and reviews scale with it)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dataset", default=store.DATASET_DIR, help="reuse products, sellers and category translation from here when present")
+    args = parser.parse_args()
+
+    generate(args.out, args.orders, args.seed, args.dataset)
+    print(f"Wrote {args.orders} synthetic orders to {args.out}")
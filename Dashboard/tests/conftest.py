@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+# The dashboard modules are imported flat, as streamlit runs them from this directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import store
+import synthetic
+
+
+@pytest.fixture(scope="session")
+def synthetic_raw(tmp_path_factory):
+    # Raw CSVs of a small synthetic Olist dataset; Dataset/ is never used, so the tests run without it
+    root = tmp_path_factory.mktemp("olist")
+    return synthetic.generate(str(root / "raw"), 3_000, seed=7, dataset_dir=str(root / "missing"))
+
+
+@pytest.fixture(scope="session")
+def synthetic_store(synthetic_raw, tmp_path_factory):
+    # The Feather store built from it, shared by the tests that only read it
+    store_dir = str(tmp_path_factory.mktemp("store"))
+    store.build_store(synthetic_raw, store_dir)
+    return store_dir
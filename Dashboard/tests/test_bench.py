@@ -0,0 +1,21 @@
+import assets
+import bench
+
+
+def test_benchmarks_run_offline(synthetic_raw, tmp_path):
+    # Every benchmark case runs once on the small dataset; timing them is left to python bench.py
+    with assets.offline():
+        cases = bench.benchmarks(synthetic_raw, str(tmp_path / "store"), str(tmp_path / "charts"))
+        for fn in cases.values():
+            fn()
+    assert list((tmp_path / "charts").rglob("*.png"))
+
+
+def test_run_restores_offline(tmp_path, monkeypatch):
+    monkeypatch.setattr(assets, "OFFLINE", False)
+    results = bench.run([300], repeat=1, only=["store.load", "filter."], work_dir=str(tmp_path))
+    assert assets.OFFLINE is False
+    scale = results["results"]["300"]
+    assert set(scale) == {"store.load", "filter.boolean_mask", "filter.time_index"}
+    assert {"wall_min", "wall_median", "peak_mb", "arrow_peak_mb", "rss_peak_mb"} <= set(scale["store.load"])
+    assert bench.compare(results, results) == []
@@ -0,0 +1,29 @@
+import pandas as pd
+import pytest
+
+import store
+from cache import ResultCache
+from cube import DailyCube
+from engine import OrdersDatabase
+from function import DataAnalyzer
+from timeindex import TimeIndex
+
+
+@pytest.fixture(scope="module")
+def time_index(synthetic_store):
+    return TimeIndex(store.load_store(store.MAIN_STORE, store_dir=synthetic_store), "order_approved_at")
+
+
+def test_backends_do_not_share_results(synthetic_store, time_index, tmp_path):
+    cache = ResultCache()
+    start_date, end_date = time_index.min.date(), time_index.max.date()
+    analyzers = {
+        "rows": lambda **kwargs: DataAnalyzer.from_time_index(time_index, start_date, end_date, **kwargs),
+        "cube": lambda **kwargs: DataAnalyzer.from_time_index(time_index, start_date, end_date, cube=DailyCube.from_frame(time_index.slice()), **kwargs),
+        "sql": lambda **kwargs: DataAnalyzer.from_sql(OrdersDatabase.sqlite(str(tmp_path / "orders.sqlite"), synthetic_store), start_date, end_date, df=time_index.slice(start_date, end_date), **kwargs),
+    }
+    for name, analyzer in analyzers.items():
+        cached = analyzer(cache=cache, version="v1").create_bystate_df(approximate=True)[0]
+        expected = analyzer().create_bystate_df(approximate=True)[0]
+        pd.testing.assert_frame_equal(cached, expected, obj=name)
+    assert len(cache) == 3
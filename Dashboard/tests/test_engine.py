@@ -0,0 +1,31 @@
+import pytest
+
+import store
+from engine import ENGINE_COLUMNS, OrdersDatabase, PandasEngine, SQLEngine, crosscheck
+from timeindex import TimeIndex, standard_ranges
+
+
+@pytest.fixture(scope="module")
+def all_df(synthetic_store):
+    return store.load_store(store.MAIN_STORE, columns=ENGINE_COLUMNS, store_dir=synthetic_store)
+
+
+def assert_engines_agree(database, all_df):
+    # The same ranges as python engine.py; the full history includes orders that were never approved
+    time_index = TimeIndex(all_df, "order_approved_at")
+    for label, start_date, end_date in standard_ranges(time_index.min, time_index.max, ["all", "year", "quarter"]):
+        if label == "all":
+            start_date = end_date = None
+            reference = PandasEngine(all_df)
+        else:
+            reference = PandasEngine(time_index.slice(start_date, end_date))
+        assert crosscheck(reference, SQLEngine(database, start_date, end_date)) == [], label
+
+
+def test_sqlite_matches_pandas(synthetic_store, all_df, tmp_path):
+    assert_engines_agree(OrdersDatabase.sqlite(str(tmp_path / "orders.sqlite"), synthetic_store), all_df)
+
+
+def test_duckdb_matches_pandas(synthetic_store, all_df):
+    pytest.importorskip("duckdb")
+    assert_engines_agree(OrdersDatabase.duckdb(synthetic_store), all_df)
@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from groupstats import grouped_bootstrap_ci, grouped_t_interval
+
+
+@pytest.fixture(scope="module")
+def payments():
+    rng = np.random.default_rng(11)
+    groups = np.repeat(["a", "b", "c"], [400, 900, 1500])
+    means = pd.Series({"a": 120.0, "b": 160.0, "c": 200.0})
+    return pd.DataFrame({"customer_state": groups, "payment_value": rng.normal(means[groups].to_numpy(), 40.0)})
+
+
+def test_bootstrap_matches_t_interval_on_normal_data(payments):
+    t = grouped_t_interval(payments, "customer_state", "payment_value").set_index("customer_state")
+    boot = grouped_bootstrap_ci(payments, "customer_state", "payment_value", n_boot=2000, seed=3).set_index("customer_state")
+    np.testing.assert_allclose(boot["mean"], t["mean"])
+    np.testing.assert_array_equal(boot["count"], t["count"])
+    width = (t["ci_hi"] - t["ci_low"]).to_numpy()
+    np.testing.assert_allclose(boot["ci_low"], t["ci_low"], atol=0.1 * width.max())
+    np.testing.assert_allclose(boot["ci_hi"], t["ci_hi"], atol=0.1 * width.max())
+
+
+def test_bootstrap_skips_missing_group_keys(payments):
+    df = payments.assign(customer_state=payments["customer_state"].where(np.arange(len(payments)) % 7 != 0))
+    boot = grouped_bootstrap_ci(df, "customer_state", "payment_value", n_boot=200, seed=3).set_index("customer_state")
+    assert list(boot.index) == ["a", "b", "c"]
+    assert boot["count"].sum() == df["customer_state"].notna().sum()
+    expected = df.groupby("customer_state")["payment_value"].mean()
+    np.testing.assert_allclose(boot["mean"], expected)
@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import store
+from cube import CUBE_DIMENSIONS, DailyCube
+from delivery import ROLLUP_DIMENSIONS, DeliveryRollup
+from schema import load_optimized, optimize_frame
+from timeindex import TimeIndex
+
+
+@pytest.fixture(scope="module")
+def full_df(synthetic_store):
+    return store.load_store(store.MAIN_STORE, store_dir=synthetic_store)
+
+
+def write_segments(store_dir, df, cuts):
+    # Base file plus one delta per cut; cuts fall inside days, so neighbouring segments share a day
+    bounds = [0] + list(cuts) + [len(df)]
+    store.write_store(df.iloc[bounds[0]:bounds[1]], store.MAIN_STORE, store_dir)
+    for lo, hi in zip(bounds[1:-1], bounds[2:]):
+        store.append_store(df.iloc[lo:hi], store.MAIN_STORE, store_dir)
+
+
+def normalized(frame, keys):
+    frame = frame.copy()
+    for col in keys:
+        frame[col] = frame[col].astype(object)
+    return frame.sort_values(keys, ignore_index=True)
+
+
+def assert_cubes_equal(actual, expected):
+    keys = ["day"] + CUBE_DIMENSIONS
+    pd.testing.assert_frame_equal(normalized(actual.cells, keys), normalized(expected.cells, keys), check_dtype=False)
+    keys = ["day", "customer_state", "register"]
+    pd.testing.assert_frame_equal(normalized(actual.customer_sketches, keys), normalized(expected.customer_sketches, keys), check_dtype=False)
+
+
+def assert_rollups_equal(actual, expected):
+    for by in [None] + ROLLUP_DIMENSIONS:
+        pd.testing.assert_frame_equal(actual.sla(by).sort_index(), expected.sla(by).sort_index(), check_dtype=False, check_index_type=False)
+    pd.testing.assert_frame_equal(actual.daily(), expected.daily(), check_dtype=False)
+
+
+@pytest.fixture
+def split_store(tmp_path, full_df):
+    store_dir = str(tmp_path / "store")
+    n = len(full_df)
+    write_segments(store_dir, full_df.iloc[:int(n * 0.9)], [int(n * 0.7)])
+    return store_dir
+
+
+def test_load_store_reads_deltas_in_order(split_store, full_df):
+    store.append_store(full_df.iloc[int(len(full_df) * 0.9):], store.MAIN_STORE, split_store)
+    assert len(store.segments(store.MAIN_STORE, split_store)) == 3
+    pd.testing.assert_frame_equal(store.load_store(store.MAIN_STORE, store_dir=split_store), full_df, check_categorical=False)
+
+
+def test_compact_store_keeps_appended_rows(split_store, full_df):
+    store.append_store(full_df.iloc[int(len(full_df) * 0.9):], store.MAIN_STORE, split_store)
+    store.compact_store(store.MAIN_STORE, split_store)
+    assert store.delta_paths(store.MAIN_STORE, split_store) == []
+    pd.testing.assert_frame_equal(store.load_store(store.MAIN_STORE, store_dir=split_store), full_df, check_categorical=False)
+
+
+def test_cube_refresh_folds_only_new_segments(split_store, full_df, tmp_path, monkeypatch):
+    cube_dir = str(tmp_path / "cube")
+    DailyCube.refresh(cube_dir, split_store)
+    store.append_store(full_df.iloc[int(len(full_df) * 0.9):], store.MAIN_STORE, split_store)
+
+    built = []
+    from_frame = DailyCube.from_frame
+    monkeypatch.setattr(DailyCube, "from_frame", classmethod(lambda cls, df: built.append(len(df)) or from_frame(df)))
+    cube = DailyCube.refresh(cube_dir, split_store)
+    assert built == [len(full_df) - int(len(full_df) * 0.9)]
+    assert cube.segments == store.segments(store.MAIN_STORE, split_store)
+    assert_cubes_equal(cube, from_frame(full_df))
+    assert_cubes_equal(DailyCube.load(cube_dir), from_frame(full_df))
+
+
+def test_cube_rebuilds_after_base_rewrite(split_store, full_df, tmp_path):
+    cube_dir = str(tmp_path / "cube")
+    DailyCube.refresh(cube_dir, split_store)
+    store.append_store(full_df.iloc[int(len(full_df) * 0.9):], store.MAIN_STORE, split_store)
+    store.compact_store(store.MAIN_STORE, split_store)
+    assert_cubes_equal(DailyCube.refresh(cube_dir, split_store), DailyCube.from_frame(full_df))
+
+
+def test_cube_sketches_hash_stored_ids(full_df):
+    # Surrogate keys would hash to different registers than the customer_id strings append.py sketches
+    optimized, encoders = optimize_frame(full_df)
+    assert not DailyCube.from_frame(optimized).customer_sketches.equals(DailyCube.from_frame(full_df).customer_sketches)
+
+
+def test_delivery_refresh_recomputes_shared_days(split_store, full_df, tmp_path):
+    rollup_dir = str(tmp_path / "delivery")
+    DeliveryRollup.refresh(rollup_dir, split_store)
+    store.append_store(full_df.iloc[int(len(full_df) * 0.9):], store.MAIN_STORE, split_store)
+
+    time_index = TimeIndex(store.load_store(store.MAIN_STORE, store_dir=split_store))
+    rollup = DeliveryRollup.refresh(rollup_dir, split_store, orders=time_index.slice)
+    assert_rollups_equal(rollup, DeliveryRollup.from_frame(full_df))
+    assert_rollups_equal(DeliveryRollup.load(rollup_dir), DeliveryRollup.from_frame(full_df))
+    # Without in-memory orders the shared days are read back from the store
+    assert_rollups_equal(DeliveryRollup.refresh(str(tmp_path / "fresh"), split_store), DeliveryRollup.from_frame(full_df))
+
+
+def test_optimized_frame_matches_optimize_frame(split_store, full_df, tmp_path):
+    cache_dir = str(tmp_path / "optimized")
+    load_optimized(cache_dir, store_dir=split_store)
+    store.append_store(full_df.iloc[int(len(full_df) * 0.9):], store.MAIN_STORE, split_store)
+
+    optimized, encoders = load_optimized(cache_dir, store_dir=split_store)
+    expected, expected_encoders = optimize_frame(full_df)
+    pd.testing.assert_frame_equal(optimized, expected, check_dtype=False, check_categorical=False)
+    for col, encoder in expected_encoders.items():
+        assert np.array_equal(encoders[col].keys.to_numpy(), encoder.keys.to_numpy())
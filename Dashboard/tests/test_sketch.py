@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from sketch import HyperLogLog, grouped_distinct, relative_error
+
+# Estimates are checked against the exact count with a margin of K standard errors
+K = 4
+
+
+def synthetic_ids(n, distinct, seed):
+    # Hex IDs like the Olist keys, drawn with repeats from a pool of `distinct` values
+    rng = np.random.default_rng(seed)
+    pool = np.array([f"{value:032x}" for value in rng.integers(0, 2**63, size=distinct)], dtype=object)
+    return pd.Series(pool[rng.integers(0, distinct, size=n)])
+
+
+@pytest.mark.parametrize("precision", [10, 12, 14])
+@pytest.mark.parametrize("distinct", [200, 5_000, 100_000])
+def test_estimate_within_error(precision, distinct):
+    ids = synthetic_ids(3 * distinct, distinct, seed=precision * distinct)
+    exact = ids.nunique()
+    estimate = HyperLogLog.from_values(ids, precision).count()
+    assert abs(estimate - exact) <= K * relative_error(precision) * exact
+
+
+def test_missing_values_are_ignored():
+    ids = synthetic_ids(10_000, 2_000, seed=1)
+    with_missing = pd.concat([ids, pd.Series([None, np.nan] * 100, dtype=object)], ignore_index=True)
+    assert np.array_equal(HyperLogLog.from_values(with_missing).registers, HyperLogLog.from_values(ids).registers)
+
+
+def test_merge_equals_sketch_of_union():
+    ids = synthetic_ids(60_000, 30_000, seed=2)
+    left, right = ids.iloc[:40_000], ids.iloc[25_000:]
+    merged = HyperLogLog.from_values(left).merge(HyperLogLog.from_values(right))
+    union = HyperLogLog.from_values(pd.concat([left, right]).drop_duplicates())
+    assert np.array_equal(merged.registers, union.registers)
+    assert merged.count() == union.count()
+
+
+def test_merge_rejects_different_precision():
+    with pytest.raises(ValueError):
+        HyperLogLog(12).merge(HyperLogLog(14))
+
+
+def test_grouped_distinct_matches_per_group_sketches():
+    rng = np.random.default_rng(3)
+    ids = synthetic_ids(50_000, 20_000, seed=3)
+    df = pd.DataFrame({"state": rng.choice(["SP", "RJ", "MG", "AC"], size=len(ids), p=[0.6, 0.25, 0.149, 0.001]), "id": ids})
+
+    grouped = grouped_distinct(df, "state", "id", precision=12)
+    exact = df.groupby("state")["id"].nunique()
+    assert list(grouped.index) == list(exact.index)
+    for state, ids_in_state in df.groupby("state")["id"]:
+        assert grouped[state] == round(HyperLogLog.from_values(ids_in_state, 12).count())
+    assert (np.abs(grouped - exact) <= K * relative_error(12) * exact).all()
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+
+from perf import timed
+
+
+class TimeIndex:
+    # Date-range lookups over a frame sorted by a datetime64 column, with NaT rows kept at the end.
+    # Slices are positional (iloc) so they share memory with the base frame instead of copying it.
+    def __init__(self, df, column="order_approved_at"):
+        values = df[column].to_numpy(dtype="datetime64[ns]")
+        nat = np.isnat(values)
+        n_valid = len(values) - int(nat.sum())
+        if nat[:n_valid].any():
+            raise ValueError(f"NaT values in '{column}' must be sorted to the end of the frame")
+        values = values[:n_valid]
+        if n_valid > 1 and (values[1:] < values[:-1]).any():
+            raise ValueError(f"Frame must be sorted by '{column}'")
+
+        self.df = df
+        self.column = column
+        self.n_valid = n_valid
+        self._values = values
+
+    def __len__(self):
+        return self.n_valid
+
+    @property
+    def min(self):
+        return pd.Timestamp(self._values[0]) if self.n_valid else pd.NaT
+
+    @property
+    def max(self):
+        return pd.Timestamp(self._values[-1]) if self.n_valid else pd.NaT
+
+    def bounds(self, start_date=None, end_date=None):
+        # Both ends are whole days and inclusive: [start_date 00:00, end_date + 1 day)
+        lo = 0
+        hi = self.n_valid
+        if start_date is not None:
+            lo = int(np.searchsorted(self._values, np.datetime64(pd.Timestamp(start_date).normalize(), "ns"), side="left"))
+        if end_date is not None:
+            end = pd.Timestamp(end_date).normalize() + pd.Timedelta(days=1)
+            hi = int(np.searchsorted(self._values, np.datetime64(end, "ns"), side="left"))
+        return lo, max(lo, hi)
+
+    @timed("filter.time_index")
+    def slice(self, start_date=None, end_date=None):
+        lo, hi = self.bounds(start_date, end_date)
+        return self.df.iloc[lo:hi]
+
+    def nat_rows(self):
+        return self.df.iloc[self.n_valid:]
+
+
+def standard_ranges(min_date, max_date, periods=("all", "year", "quarter")):
+    # (label, start_date, end_date) for the full history and every calendar year / quarter / month it spans
+    min_date = pd.Timestamp(min_date).normalize()
+    max_date = pd.Timestamp(max_date).normalize()
+    frequencies = {"year": "Y", "quarter": "Q", "month": "M"}
+    ranges = []
+    if "all" in periods:
+        ranges.append(("all", min_date.date(), max_date.date()))
+    for period in periods:
+        if period not in frequencies:
+            continue
+        for label in pd.period_range(min_date, max_date, freq=frequencies[period]):
+            start = max(label.start_time.normalize(), min_date)
+            end = min(label.end_time.normalize(), max_date)
+            ranges.append((str(label), start.date(), end.date()))
+    return ranges